@@ -1,6 +1,12 @@
+import io
 import os
+import csv
+import json
 import math
 import time
+import queue
+import base64
+import threading
 import django
 django.setup()
 from django.db import connection
@@ -11,13 +17,18 @@ from fastapi import Request
 from fastapi import Response
 from fastapi import APIRouter
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.routing import APIRoute
 from fastapi import status
 from pydantic import BaseModel
 from typing import Dict, List, Optional
-from metadata.models import MetadataColumn, Metadata
+from metadata.cache import metadata_cache, MetadataNotFound
 from database.models import PlantEntity, DeliveryState
+from database.delivery_counts import count_deliveries
+from database.delivery_queries import (
+    delivery_list, deliveries_between, deliveries_after, deliveries_before, last_deliveries,
+)
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
@@ -64,6 +75,8 @@ Retrieves the metadata for delivery information in the specified language.
 The metadata includes the column titles, types, and descriptions based on the specified language code (e.g., "en" for English, "de" for German). 
 The `metadata_id` is used to specify which set of metadata to retrieve.
 
+The response carries a strong `ETag`. Clients sending it back in `If-None-Match` get a `304 Not Modified` while the metadata is unchanged.
+
 ### Path Parameters
 - **language**: A string representing the language code (e.g., "en" for English, "de" for German). Default is "de".
 
@@ -72,6 +85,7 @@ The `metadata_id` is used to specify which set of metadata to retrieve.
 
 ### Responses
 - **200 OK**: Returns the metadata details.
+- **304 Not Modified**: The metadata matches the `If-None-Match` ETag.
 - **404 Not Found**: Returns an error if the specified metadata ID or language is not found.
 - **500 Internal Server Error**: Returns an error if an unexpected error occurs.
 """
@@ -80,54 +94,30 @@ The `metadata_id` is used to specify which set of metadata to retrieve.
 @router.api_route(
     "/delivery/metadata/{language}", methods=["GET"], tags=["Delivery"], summary=summary, description=description,
 )
-def get_delivery_metadata(response: Response, language:str="de", metadata_id:int=1):
+def get_delivery_metadata(request: Request, response: Response, language:str="de", metadata_id:int=1):
     metadata = {}
     try:
-        if not MetadataColumn.objects.filter(metadata_id=metadata_id).exists():
+        try:
+            localized = metadata_cache.get(metadata_id, language)
+        except MetadataNotFound as e:
             metadata = {
                 "error": {
                     "status_code": "not found",
-                    "status_description": f"Metadata ID {metadata_id} not found",
-                    "deatil": f"Metadata ID {metadata_id} not found",
+                    "status_description": str(e),
+                    "deatil": str(e),
                 }
             }
             
             response.status_code = status.HTTP_404_NOT_FOUND
             return metadata
         
-        columns = MetadataColumn.objects.filter(metadata_id=metadata_id).select_related('metadata').prefetch_related('localizations')
-
-        col = []
-        for column in columns:
-            localization = column.localizations.filter(language=language).first()
-            if not localization:
-                metadata = {
-                    "error": {
-                        "status_code": "not found",
-                        "status_description": f"language {language} not found",
-                        "deatil": f"language {language} not found",
-                    }
-                }
-                
-                response.status_code = status.HTTP_404_NOT_FOUND
-                return metadata
-            
-            col.append(
-                {
-                    column.column_name: {
-                        "title": localization.title,
-                        "type": column.type,
-                        "description": localization.description                        
-                    }
-
-                }
-            )
-            
-        metadata = {
-            "columns": col,
-            "primary_key": Metadata.objects.get(id=metadata_id).primary_key
-        }
-        return metadata
+        headers = {"ETag": localized.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or localized.etag in [tag.strip() for tag in if_none_match.split(",")]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        response.headers.update(headers)
+        return localized.content
 
     except Exception as e:
         metadata = {
@@ -167,6 +157,101 @@ class DeliveryResponse(BaseModel):
     pages: int
     items: List[DeliveryItemResponse]
     flag_interpretation: Dict[str, FlagInterpretationResponse]
+    next: Optional[str] = None
+    prev: Optional[str] = None
+
+
+def encode_cursor(delivery, direction):
+    """
+    Encode the position of a delivery in the (created_at, id) order into an opaque page token.
+
+    :param direction: 'next' for the page after the delivery, 'prev' for the page before it
+    """
+    position = {'c': delivery.created_at.isoformat(), 'i': delivery.id, 'd': direction}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    :return: A tuple of (created_at, id, direction)
+    :raises ValueError: If the token is not a page token
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        direction = position['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return datetime.fromisoformat(position['c']), int(position['i']), direction
+    except Exception:
+        raise ValueError(f"Invalid cursor {cursor}")
+
+
+def keyset_page(delivery_state, cursor, items_per_page):
+    """
+    Read the page of deliveries next to a cursor with a keyset condition on (created_at, id), so
+    the cost of a page does not depend on how deep it is.
+
+    :return: A tuple of (deliveries, has_next, has_prev) in (-created_at, -id) order
+    """
+    created_at, delivery_id, direction = decode_cursor(cursor)
+    if direction == 'next':
+        deliveries = list(deliveries_after(delivery_state, created_at, delivery_id)[:items_per_page + 1])
+        return deliveries[:items_per_page], len(deliveries) > items_per_page, True
+
+    deliveries = list(deliveries_before(delivery_state, created_at, delivery_id)[:items_per_page + 1])
+    return list(reversed(deliveries[:items_per_page])), True, len(deliveries) > items_per_page
+
+
+def date_range(from_date=None, to_date=None):
+    """
+    Resolve the from_date and to_date query parameters of the delivery listings.
+
+    :return: A tuple of (from_date, to_date) in UTC, from today and up to the end of to_date by default
+    """
+    today = datetime.today()
+    if from_date is None:
+        from_date = datetime(today.year, today.month, today.day)
+
+    if to_date is None:
+        to_date = from_date + timedelta(days=1)
+
+    return from_date.replace(tzinfo=timezone.utc), to_date.replace(tzinfo=timezone.utc) + timedelta(days=1)
+
+
+def delivery_row(delivery):
+    """
+    Map a DeliveryState to the delivery record of the listings.
+
+    :return: A DeliveryItemResponse
+    """
+    beginn = delivery.delivery_start
+    ende = delivery.delivery_end
+
+    if delivery.delivery_status == "on-going":
+        ende = datetime.now(tz=timezone.utc)
+
+    delivery_id = str(delivery.id).zfill(6)
+    severity_level = 0 # query_impurity_severity_level(url=f"{os.environ.get('FLAG_API_URL')}/api/v1/impurity/delivery/{delivery_id}")
+
+    if not delivery.meta_info:
+        delivery.meta_info = {}
+
+    long_object_severity_level = 0
+
+    impurity_flag = mapping_flag[severity_level]
+    long_object_flag = mapping_flag[long_object_severity_level]
+
+    return DeliveryItemResponse(
+        delivery_id=delivery_id,
+        date=(beginn + timedelta(hours=2)).strftime('%Y-%m-%d'),
+        start=(beginn + timedelta(hours=2)).strftime('%H:%M:%S'),
+        end=(ende + timedelta(hours=2)).strftime('%H:%M:%S'),
+        location=delivery.delivery_location,
+        problematic_objetcs=impurity_flag,
+        long_objects=long_object_flag,
+        dust=green_square,  # Placeholder
+        hotspot=green_square,  # Placeholder
+    )
 
 summary="Retrieve Delivery Data",
 description="""
@@ -180,6 +265,7 @@ The delivery data includes the delivery ID, date, start and end times, location,
 - **to_date** (optional): A datetime object representing the end date to filter deliveries. Defaults to the day after `from_date` if not provided.
 - **items_per_page** (optional): An integer specifying the number of delivery records to return per page. Default is 15.
 - **page** (optional): An integer specifying which page of results to return. Default is 1.
+- **cursor** (optional): The `next` or `prev` token of a previous response. When given, the page next to the token is returned and `page` is ignored; unlike `page`, the latency of a token does not grow with the depth of the page.
 - **metadata_id** (optional): An integer representing the metadata ID to use. Default is 1.
 
 ### Responses
@@ -200,35 +286,41 @@ def get_delivery(
     to_date:datetime=None, 
     items_per_page:int=15, 
     page:int=1, 
+    cursor:str=None,
     metadata_id:int=1
     ) -> DeliveryResponse:
     results = {}
     try:
         
         
-        today = datetime.today()
-        if from_date is None:
-            from_date = datetime(today.year, today.month, today.day)
-        
-        if to_date is None:
-            to_date = from_date + timedelta(days=1)
-            
-        from_date = from_date.replace(tzinfo=timezone.utc)
-        to_date = to_date.replace(tzinfo=timezone.utc) + timedelta(days=1)
-        
+        from_date, to_date = date_range(from_date, to_date)
+
         if page < 1:
             page = 1
         
-        if items_per_page==0:
+        if items_per_page<=0:
             results['error'] = {
                 'status_code': 'bad request',
-                'status_description': f'Bad Request, items_per_pages should not be 0',
+                'status_description': f'Bad Request, items_per_pages should be greater than 0',
                 'detail': "division by zero."
             }
 
             response.status_code = status.HTTP_400_BAD_REQUEST
             return results
         
+        if cursor is not None:
+            try:
+                decode_cursor(cursor)
+            except ValueError as e:
+                results['error'] = {
+                    'status_code': 'bad request',
+                    'status_description': 'Bad Request, invalid cursor',
+                    'detail': str(e),
+                }
+                
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return results
+        
         if gate_id is not None:
             if not PlantEntity.objects.filter(entity_uid=gate_id).exists():
                 results = {
@@ -243,44 +335,21 @@ def get_delivery(
                 return results
             
             plant_entity = PlantEntity.objects.get(entity_uid=gate_id)
-            delivery_state = DeliveryState.objects.filter(entity=plant_entity, created_at__range=(from_date, to_date )).order_by('-created_at')
+            delivery_state = delivery_list(from_date, to_date, entity_id=plant_entity.id)
+            total_record = count_deliveries(from_date, to_date, entity_id=plant_entity.id)
         else:
-            delivery_state = DeliveryState.objects.filter(created_at__range=(from_date, to_date)).order_by('-created_at')
+            delivery_state = delivery_list(from_date, to_date)
+            total_record = count_deliveries(from_date, to_date)
         
         rows = []
-        total_record = len(delivery_state)
-        for delivery in delivery_state[(page - 1) * items_per_page:page * items_per_page]:
-            
-            beginn = delivery.delivery_start
-            ende = delivery.delivery_end
-            
-            if delivery.delivery_status == "on-going":
-                ende = datetime.now(tz=timezone.utc)
-
-            delivery_id = str(delivery.id).zfill(6)
-            severity_level = 0 # query_impurity_severity_level(url=f"{os.environ.get('FLAG_API_URL')}/api/v1/impurity/delivery/{delivery_id}")
-            
-            if not delivery.meta_info:
-                delivery.meta_info = {}
-            
-            long_object_severity_level = 0
-            
-            impurity_flag = mapping_flag[severity_level]
-            long_object_flag = mapping_flag[long_object_severity_level]
-              
-            row = DeliveryItemResponse(
-                delivery_id=delivery_id,
-                date=(beginn + timedelta(hours=2)).strftime('%Y-%m-%d'),
-                start=(beginn + timedelta(hours=2)).strftime('%H:%M:%S'),
-                end=(ende + timedelta(hours=2)).strftime('%H:%M:%S'),
-                location=delivery.delivery_location,
-                problematic_objetcs=impurity_flag,
-                long_objects=long_object_flag,
-                dust=green_square,  # Placeholder
-                hotspot=green_square,  # Placeholder
-            )
-            
-            rows.append(row.dict())
+        if cursor is not None:
+            deliveries, has_next, has_prev = keyset_page(delivery_state, cursor, items_per_page)
+        else:
+            deliveries = list(delivery_state[(page - 1) * items_per_page:page * items_per_page])
+            has_next, has_prev = page * items_per_page < total_record, page > 1
+        
+        for delivery in deliveries:
+            rows.append(delivery_row(delivery).dict())
             
         connection.close()
         
@@ -289,6 +358,8 @@ def get_delivery(
             total_record=total_record,
             pages=math.ceil(total_record / items_per_page),
             items=rows,
+            next=encode_cursor(deliveries[-1], 'next') if deliveries and has_next else None,
+            prev=encode_cursor(deliveries[0], 'prev') if deliveries and has_prev else None,
             flag_interpretation={
                 'niedrig': {
                     'description': "Auffälligkeitgrad ist niedrig",
@@ -341,7 +412,178 @@ def get_delivery(
         
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         return results
-    
+
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+EXPORT_MAX_PENDING_CHUNKS = int(os.getenv('EXPORT_MAX_PENDING_CHUNKS', 4))
+
+def export_chunks(delivery_state, format):
+    """
+    Encode deliveries as NDJSON or CSV, one chunk of text per EXPORT_CHUNK_SIZE rows.
+
+    The deliveries are read with a server-side cursor, so only one chunk of rows is held in memory.
+    """
+    fields = list(DeliveryItemResponse.__fields__)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    if format == 'csv':
+        writer.writeheader()
+
+    rows = 0
+    for delivery in delivery_state.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = delivery_row(delivery).dict()
+        if format == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+        rows += 1
+        if rows % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def stream_in_thread(chunks):
+    """
+    Stream a blocking generator from one dedicated thread.
+
+    The generator owns its database connection and server-side cursor for the whole export, which a
+    thread pool would hand from thread to thread. At most EXPORT_MAX_PENDING_CHUNKS chunks wait for a
+    slow client; when the client goes away, the thread stops and closes its connection.
+    """
+    pending = queue.Queue(maxsize=EXPORT_MAX_PENDING_CHUNKS)
+    stopped = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    break
+            else:
+                put(end)
+        except Exception as err:
+            put(err)
+        finally:
+            chunks.close()
+            connection.close()
+
+    threading.Thread(target=produce, name='delivery-export', daemon=True).start()
+    try:
+        while True:
+            try:
+                item = await run_in_threadpool(pending.get, timeout=1)
+            except queue.Empty:
+                continue
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                # The headers are sent already: abort the response so the client does not take a
+                # truncated export for a complete one.
+                print(f"Error occured while exporting deliveries: {item}")
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+
+summary="Export Delivery Data"
+description="""
+Streams all the deliveries of a gate and date range, with the same fields as `/api/v1/delivery`, for bulk exports.
+
+Rows are streamed as they are read from the database, so memory use does not depend on the size of the range.
+
+### Query Parameters
+- **gate_id** (optional): A string representing the unique identifier for a gate. All gates if not provided.
+- **from_date** (optional): A datetime object representing the start date to filter deliveries. Defaults to today's date if not provided.
+- **to_date** (optional): A datetime object representing the end date to filter deliveries. Defaults to the day after `from_date` if not provided.
+- **format** (optional): `ndjson` (one JSON object per line) or `csv` (with a header row). Default is `ndjson`.
+
+### Responses
+- **200 OK**: Streams the deliveries, oldest first.
+- **400 Bad Request**: Returns an error if the format is not supported.
+- **404 Not Found**: Returns an error if the specified gate ID is not found.
+- **500 Internal Server Error**: Returns an error if an unexpected error occurs.
+"""
+
+
+@router.api_route(
+    "/delivery/export", methods=["GET"], tags=["Delivery"], summary=summary, description=description,
+)
+def export_delivery(
+    response: Response,
+    gate_id:str=None,
+    from_date:datetime=None,
+    to_date:datetime=None,
+    format:str='ndjson',
+    ):
+    results = {}
+    try:
+        if format not in EXPORT_FORMATS:
+            results['error'] = {
+                'status_code': 'bad request',
+                'status_description': f'Bad Request, format should be one of {", ".join(EXPORT_FORMATS)}',
+                'detail': f"Unsupported format {format}",
+            }
+
+            response.status_code = status.HTTP_400_BAD_REQUEST
+            return results
+
+        from_date, to_date = date_range(from_date, to_date)
+        entity_id = None
+        if gate_id is not None:
+            plant_entity = PlantEntity.objects.filter(entity_uid=gate_id).first()
+            if plant_entity is None:
+                results = {
+                    "error": {
+                        "status_code": "not found",
+                        "status_description": f"Gate ID {gate_id} not found",
+                        "deatil": f"Gate ID {gate_id} not found",
+                    }
+                }
+
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return results
+
+            entity_id = plant_entity.id
+
+        delivery_state = deliveries_between(from_date, to_date, entity_id)
+        connection.close()
+
+        filename = f"deliveries_{gate_id or 'all'}_{from_date.strftime('%Y%m%d')}_{(to_date - timedelta(days=1)).strftime('%Y%m%d')}.{format}"
+        return StreamingResponse(
+            stream_in_thread(export_chunks(delivery_state.order_by('created_at', 'id'), format)),
+            media_type=EXPORT_FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    except Exception as e:
+        results['error'] = {
+            'status_code': 500,
+            "status_description": "Internal Server Error",
+            "detail": str(e),
+        }
+
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return results
 
 
 
@@ -549,7 +791,8 @@ def get_gate_status(response: Response, gate_id:str, timestamp:datetime, diff:fl
             return results
         
         plant_entity = PlantEntity.objects.get(entity_uid=gate_id)
-        if not DeliveryState.objects.filter(entity=plant_entity).exists():
+        delivery = last_deliveries(plant_entity.id).first()
+        if delivery is None:
             results['error'] = {
                 'status_code': "Not-Found",
                 'status_description': f"delivery_id for {gate_id} is not found",
@@ -559,7 +802,6 @@ def get_gate_status(response: Response, gate_id:str, timestamp:datetime, diff:fl
             return results
             
             
-        delivery = DeliveryState.objects.filter(entity=plant_entity).last()
         delivery_end = datetime.now(tz=timezone.utc)
         if delivery.delivery_status == 'on-going':
             results = {
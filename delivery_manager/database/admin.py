@@ -1,6 +1,6 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
-from .models import PlantInfo, EntityType, PlantEntity, DeliveryEvent, DeliveryState, Camera
+from .models import PlantInfo, EntityType, PlantEntity, DeliveryEvent, DeliveryState, Camera, SyncOutbox, DeadLetter
 
 admin.site.site_header = "Delivery Manager"
 admin.site.site_title = "Delivery Manager"
@@ -67,3 +67,25 @@ class DeliveryStateAdmin(ModelAdmin):
     list_filter = ('delivery_status', 'delivery_location', 'created_at')  # Add filters for delivery status and location
     ordering = ('-delivery_start',)  # Order by delivery start date, newest first
     readonly_fields = ('created_at',)  # Make created_at field read-only
+
+@admin.register(SyncOutbox)
+class SyncOutboxAdmin(ModelAdmin):
+    """
+    Admin interface for the SyncOutbox model.
+    """
+    list_display = ('event_id', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')  # Display outbox fields
+    search_fields = ('event_id', 'last_error')  # Search by delivery id and error
+    list_filter = ('status', 'created_at')  # Add filters for status and creation date
+    ordering = ('-created_at',)  # Order by creation date, newest first
+    readonly_fields = ('created_at', 'sent_at')  # Make timestamps read-only
+
+@admin.register(DeadLetter)
+class DeadLetterAdmin(ModelAdmin):
+    """
+    Admin interface for the DeadLetter model.
+    """
+    list_display = ('task_id', 'task_name', 'location', 'event_timestamp', 'status', 'retries', 'updated_at')  # Display dead letter fields
+    search_fields = ('task_id', 'location', 'error')  # Search by task id, gate and error
+    list_filter = ('status', 'task_name', 'created_at')  # Add filters for status, task and creation date
+    ordering = ('-updated_at',)  # Order by last failure, newest first
+    readonly_fields = ('created_at', 'updated_at', 'redriven_at')  # Make timestamps read-only
@@ -0,0 +1,75 @@
+import os
+import threading
+from django.db.models import OuterRef, Subquery
+from .models import PlantEntity, DeliveryState
+from .delivery_queries import last_deliveries
+
+MISSING = object()
+
+
+class DeliveryStateCache:
+    """
+    Write-through cache of the last DeliveryState of every gate, keyed by PlantEntity id.
+
+    The delivery worker is the only writer of DeliveryState, so once a gate is loaded its entry is kept
+    up to date by `set` after every save, and events that do not move the gate need no SELECT at all.
+    The cache is validated against the database on worker start (`load`) and dropped for a gate after
+    an error (`invalidate`). It is only correct while a gate is consumed by a single worker process,
+    so it is off unless DELIVERY_STATE_CACHE=true, which is never to be set when several workers
+    share the events of a gate.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, entity_id):
+        """
+        Return the cached last delivery of a gate, None if the gate has no delivery, or MISSING if the gate is not cached.
+        """
+        if not self.enabled:
+            return MISSING
+        return self.entries.get(entity_id, MISSING)
+
+    def set(self, entity_id, delivery_state):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.entries[entity_id] = delivery_state
+
+    def load(self):
+        """
+        Reload the last delivery of every gate from the database.
+
+        :return: A mapping of entity_uid to the status of its last delivery, or None for gates without delivery
+        """
+        last_delivery_id = last_deliveries(OuterRef('pk')).values('id')[:1]
+        gates = list(
+            PlantEntity.objects.annotate(
+                last_delivery_id=Subquery(last_delivery_id)
+            ).values_list('id', 'entity_uid', 'last_delivery_id')
+        )
+        deliveries = DeliveryState.objects.in_bulk([delivery_id for _, _, delivery_id in gates if delivery_id is not None])
+
+        entries = {entity_id: deliveries.get(delivery_id) for entity_id, _, delivery_id in gates}
+        if self.enabled:
+            with self.lock:
+                self.entries = entries
+
+        return {
+            entity_uid: entries[entity_id].delivery_status if entries[entity_id] else None
+            for entity_id, entity_uid, _ in gates
+        }
+
+    def invalidate(self, entity_id=None):
+        with self.lock:
+            if entity_id is None:
+                self.entries = {}
+            else:
+                self.entries.pop(entity_id, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+delivery_cache = DeliveryStateCache(enabled=os.getenv('DELIVERY_STATE_CACHE', 'false').lower() in ('1', 'true', 'yes'))
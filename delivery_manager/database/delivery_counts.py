@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from .models import PlantEntity, DeliveryDailyCount
+from .delivery_queries import deliveries_between, deliveries_created
+
+
+def day_start(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def record_delivery(entity_id, created_at, delta=1):
+    """
+    Apply a created (delta=1) or deleted (delta=-1) delivery to the daily count of its gate.
+
+    Only the row of the gate is locked, so gates never wait for each other; totals of all gates are
+    summed from the rows of the gates. A missing count of the day is created from an exact count of the
+    day, which already includes the delivery. When a concurrent transaction creates it first, the unique
+    constraint rejects the second row and the count is incremented instead, so no delivery is counted
+    twice or missed.
+    """
+    day = created_at.astimezone(timezone.utc).date()
+    counts = DeliveryDailyCount.objects.filter(entity_id=entity_id, day=day)
+    if counts.update(count=F('count') + delta) or delta < 0:
+        return
+
+    exact = deliveries_created(day_start(day), day_start(day + timedelta(days=1)), entity_id).count()
+    try:
+        with transaction.atomic():
+            DeliveryDailyCount.objects.create(entity_id=entity_id, day=day, count=exact)
+    except IntegrityError:
+        counts.update(count=F('count') + delta)
+
+
+def count_deliveries(from_date, to_date, entity_id=None):
+    """
+    Count the deliveries created between from_date and to_date (both included), of one gate or of all gates.
+
+    Whole days are summed from the daily counts of the gates; the partial days at both ends of the range
+    are counted exactly. Gate days without a count are counted with one grouped query, and the counts of
+    past days are written back so the next request finds them.
+    """
+    first_day = (from_date.astimezone(timezone.utc) - timedelta(microseconds=1)).date() + timedelta(days=1)
+    last_day = to_date.astimezone(timezone.utc).date()
+    if first_day >= last_day:
+        return deliveries_between(from_date, to_date, entity_id).count()
+
+    total = deliveries_created(from_date, day_start(first_day), entity_id).count()
+    total += deliveries_between(day_start(last_day), to_date, entity_id).count()
+
+    gates = [entity_id] if entity_id is not None else list(PlantEntity.objects.values_list('id', flat=True))
+    counts = DeliveryDailyCount.objects.filter(entity_id__in=gates, day__gte=first_day, day__lt=last_day)
+    cached = {(gate, day): count for gate, day, count in counts.values_list('entity_id', 'day', 'count')}
+    total += sum(cached.values())
+
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days)]
+    missing = [(gate, day) for day in days for gate in gates if (gate, day) not in cached]
+    if not missing:
+        return total
+
+    first_missing = min(day for _, day in missing)
+    last_missing = max(day for _, day in missing)
+    exact = {
+        (gate, day): count
+        for gate, day, count in deliveries_created(day_start(first_missing), day_start(last_missing + timedelta(days=1)), entity_id)
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.utc))
+        .values('entity', 'day')
+        .annotate(count=Count('id'))
+        .values_list('entity', 'day', 'count')
+    }
+    total += sum(exact.get(key, 0) for key in missing)
+
+    today = datetime.now(timezone.utc).date()
+    DeliveryDailyCount.objects.bulk_create(
+        [DeliveryDailyCount(entity_id=gate, day=day, count=exact.get((gate, day), 0)) for gate, day in missing if day < today],
+        ignore_conflicts=True,
+    )
+
+    return total
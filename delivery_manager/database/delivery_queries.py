@@ -0,0 +1,66 @@
+from django.db.models import Q
+from .models import DeliveryState
+
+# The DeliveryState access paths of the data API, the delivery worker and the delivery counts. The
+# query-plan tests (database/tests/test_query_plans.py) explain these very querysets against the
+# indexes of DeliveryState, so a query changed here is checked there.
+
+
+def deliveries(entity_id=None):
+    """
+    Return the deliveries of one gate, or of all gates.
+    """
+    queryset = DeliveryState.objects.all()
+    if entity_id is not None:
+        queryset = queryset.filter(entity_id=entity_id)
+    return queryset
+
+
+def deliveries_between(from_date, to_date, entity_id=None):
+    """
+    Return the deliveries created between from_date and to_date, both included.
+    """
+    return deliveries(entity_id).filter(created_at__range=(from_date, to_date))
+
+
+def deliveries_created(start, end, entity_id=None):
+    """
+    Return the deliveries created from start (included) to end (excluded).
+    """
+    return deliveries(entity_id).filter(created_at__gte=start, created_at__lt=end)
+
+
+def delivery_list(from_date, to_date, entity_id=None):
+    """
+    Return the deliveries listed by get_delivery, newest first.
+    """
+    return deliveries_between(from_date, to_date, entity_id).order_by('-created_at', '-id')
+
+
+def deliveries_after(delivery_list, created_at, delivery_id):
+    """
+    Return the deliveries of a list that come after the delivery (created_at, delivery_id), newest first.
+    """
+    return delivery_list.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=delivery_id)
+    ).order_by('-created_at', '-id')
+
+
+def deliveries_before(delivery_list, created_at, delivery_id):
+    """
+    Return the deliveries of a list that come before the delivery (created_at, delivery_id), oldest first.
+    """
+    return delivery_list.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=delivery_id)
+    ).order_by('created_at', 'id')
+
+
+def last_deliveries(entity_id):
+    """
+    Return the deliveries of a gate, last first; `.first()` is the current or last delivery of the gate.
+    """
+    return deliveries(entity_id).order_by('-created_at', '-id')
+
+
+def on_going_deliveries():
+    return DeliveryState.objects.filter(delivery_status='on-going').order_by('created_at')
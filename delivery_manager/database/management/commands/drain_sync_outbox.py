@@ -0,0 +1,158 @@
+# drain_sync_outbox.py
+
+import os
+import time
+import requests
+from datetime import timedelta
+from django.db import transaction, connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+from utils.api.base import BaseAPI
+from database.models import SyncOutbox
+
+EDGE_CLOUD_SYNC_URL = f"http://{os.getenv('EDGE_CLOUD_SYNC_HOST', '0.0.0.0')}:{os.getenv('EDGE_CLOUD_SYNC_PORT', '27092')}/api/v1/data"
+EDGE_CLOUD_SYNC_BATCH_URL = os.getenv('EDGE_CLOUD_SYNC_BATCH_URL')
+EDGE_CLOUD_SYNC_TIMEOUT = float(os.getenv('EDGE_CLOUD_SYNC_TIMEOUT', 10))
+PURGE_CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Ship pending edge-cloud-sync notifications from the outbox in batches, with retry and backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=int(os.getenv('OUTBOX_BATCH_SIZE', 50)))
+        parser.add_argument('--interval', type=float, default=float(os.getenv('OUTBOX_POLL_INTERVAL', 2)), help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--max-attempts', type=int, default=int(os.getenv('OUTBOX_MAX_ATTEMPTS', 20)))
+        parser.add_argument('--max-backoff', type=float, default=float(os.getenv('OUTBOX_MAX_BACKOFF', 600)), help='Upper bound in seconds of the delay between two attempts')
+        parser.add_argument('--lease', type=float, default=float(os.getenv('OUTBOX_LEASE', 0)), help='Seconds a claimed batch is hidden from other drainers, by default twice the time to post it')
+        parser.add_argument('--retention', type=float, default=float(os.getenv('OUTBOX_RETENTION', 7 * 86400)), help='Seconds sent notifications are kept before they are purged')
+        parser.add_argument('--purge-interval', type=float, default=float(os.getenv('OUTBOX_PURGE_INTERVAL', 3600)), help='Seconds between two purges of the sent notifications')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        session = requests.Session()
+        self.api = BaseAPI(session=session, timeout=EDGE_CLOUD_SYNC_TIMEOUT)
+        self.max_attempts = options['max_attempts']
+        self.max_backoff = options['max_backoff']
+        self.lease = timedelta(seconds=options['lease'] or 2 * options['batch_size'] * EDGE_CLOUD_SYNC_TIMEOUT)
+        purged_at = 0
+
+        while True:
+            try:
+                shipped = self.drain(batch_size=options['batch_size'])
+                if time.monotonic() - purged_at >= options['purge_interval']:
+                    self.purge(retention=options['retention'])
+                    purged_at = time.monotonic()
+            except Exception as err:
+                self.stdout.write(self.style.ERROR(f"Error draining the sync outbox: {err}"))
+                connection.close()
+                shipped = 0
+
+            if options['once']:
+                break
+
+            if not shipped:
+                time.sleep(options['interval'])
+
+    def drain(self, batch_size):
+        """
+        Ship one batch of due notifications.
+
+        A notification is only due once every earlier notification of the same delivery was shipped,
+        so a stop never overtakes its start. Rows are claimed with SKIP LOCKED in a short transaction that
+        pushes their next attempt past the lease, so several drainers can run side by side without holding
+        row locks during the HTTP calls. Rows of a drainer that dies are due again once the lease is over.
+
+        :return: The number of notifications shipped
+        """
+        earlier_pending = SyncOutbox.objects.filter(
+            event_id=OuterRef('event_id'), status='pending', id__lt=OuterRef('id')
+        )
+
+        with transaction.atomic():
+            rows = list(
+                SyncOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', next_attempt_at__lte=timezone.now())
+                .exclude(Exists(earlier_pending))
+                .order_by('id')[:batch_size]
+            )
+
+            if not rows:
+                return 0
+
+            SyncOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(next_attempt_at=timezone.now() + self.lease)
+
+        if EDGE_CLOUD_SYNC_BATCH_URL:
+            shipped = self.ship_batch(rows)
+        else:
+            shipped = self.ship_each(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"Shipped {shipped}/{len(rows)} sync notifications"))
+        return shipped
+
+    def ship_batch(self, rows):
+        try:
+            self.api.post(url=EDGE_CLOUD_SYNC_BATCH_URL, payload=[row.payload for row in rows])
+        except Exception as err:
+            for row in rows:
+                self.mark_failed(row, err)
+            return 0
+
+        for row in rows:
+            self.mark_sent(row)
+        return len(rows)
+
+    def ship_each(self, rows):
+        shipped = 0
+        failed_deliveries = set()
+        for row in rows:
+            if row.event_id in failed_deliveries:
+                self.mark_failed(row, "an earlier notification of this delivery failed", count_attempt=False)
+                continue
+
+            try:
+                self.api.post(url=EDGE_CLOUD_SYNC_URL, payload=row.payload)
+            except Exception as err:
+                failed_deliveries.add(row.event_id)
+                self.mark_failed(row, err)
+                continue
+
+            self.mark_sent(row)
+            shipped += 1
+
+        return shipped
+
+    def mark_sent(self, row):
+        row.status = 'sent'
+        row.sent_at = timezone.now()
+        row.last_error = None
+        row.save(update_fields=['status', 'sent_at', 'last_error'])
+
+    def mark_failed(self, row, err, count_attempt=True):
+        if count_attempt:
+            row.attempts += 1
+        row.last_error = str(err)
+        row.next_attempt_at = timezone.now() + timedelta(seconds=min(2 ** row.attempts, self.max_backoff))
+        if row.attempts >= self.max_attempts:
+            row.status = 'failed'
+            self.stdout.write(self.style.ERROR(f"Giving up on sync of {row.event_id} after {row.attempts} attempts: {err}"))
+        row.save(update_fields=['attempts', 'last_error', 'next_attempt_at', 'status'])
+
+    def purge(self, retention):
+        """
+        Delete the notifications sent more than `retention` seconds ago, in small chunks so no long lock is held.
+
+        :return: The number of notifications deleted
+        """
+        cutoff = timezone.now() - timedelta(seconds=retention)
+        purged = 0
+        while True:
+            ids = list(SyncOutbox.objects.filter(status='sent', sent_at__lt=cutoff).values_list('id', flat=True)[:PURGE_CHUNK_SIZE])
+            if not ids:
+                break
+            purged += SyncOutbox.objects.filter(id__in=ids).delete()[0]
+
+        if purged:
+            self.stdout.write(self.style.SUCCESS(f"Purged {purged} sent sync notifications"))
+        return purged
@@ -0,0 +1,43 @@
+# redrive_dead_letters.py
+
+import os
+from django.core.management.base import BaseCommand
+from database.models import DeadLetter
+from events_api.tasks.delivery.dead_letter import redrive
+
+
+class Command(BaseCommand):
+    help = 'List the delivery tasks that exhausted their retries, or re-drive them in per-gate event order at a controlled rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help='List the pending dead letters instead of re-driving them')
+        parser.add_argument('--location', type=str, help='Only the dead letters of this gate')
+        parser.add_argument('--task', type=str, help='Only the dead letters of this task name, e.g. delivery:create_delivery')
+        parser.add_argument('--ids', type=int, nargs='+', help='Only the dead letters with these ids')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of dead letters to re-drive')
+        parser.add_argument('--rate', type=float, default=float(os.getenv('REDRIVE_RATE', 10)), help='Maximum number of tasks re-driven per second')
+
+    def handle(self, *args, **options):
+        dead_letters = DeadLetter.objects.filter(status='pending')
+        if options['location']:
+            dead_letters = dead_letters.filter(location=options['location'])
+        if options['task']:
+            dead_letters = dead_letters.filter(task_name=options['task'])
+        if options['ids']:
+            dead_letters = dead_letters.filter(id__in=options['ids'])
+        if options['limit']:
+            dead_letters = DeadLetter.objects.filter(
+                id__in=list(dead_letters.order_by('event_timestamp', 'created_at', 'id').values_list('id', flat=True)[:options['limit']])
+            )
+
+        if options['list']:
+            for dead_letter in dead_letters.order_by('event_timestamp', 'created_at', 'id'):
+                self.stdout.write(
+                    f"{dead_letter.id}\t{dead_letter.task_name}\t{dead_letter.task_id}\t{dead_letter.location}\t"
+                    f"{dead_letter.event_timestamp}\tretries={dead_letter.retries}\t{dead_letter.error}"
+                )
+            self.stdout.write(self.style.SUCCESS(f"{dead_letters.count()} pending dead letters"))
+            return
+
+        redriven = redrive(dead_letters, rate=options['rate'], stdout=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Re-drove {redriven} dead letters"))
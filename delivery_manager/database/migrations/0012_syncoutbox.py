@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0011_camera'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=50)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Sync Outbox',
+                'db_table': 'sync_outbox',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='sync_outbox_status_a95b9e_idx'), models.Index(fields=['event_id', 'status'], name='sync_outbox_event_i_44f7a3_idx')],
+            },
+        ),
+    ]
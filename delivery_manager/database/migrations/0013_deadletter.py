@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0012_syncoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(max_length=255, unique=True)),
+                ('task_name', models.CharField(max_length=255)),
+                ('location', models.CharField(blank=True, max_length=255, null=True)),
+                ('event_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('payload', models.JSONField()),
+                ('error', models.TextField(blank=True, null=True)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('redriven', 'Redriven')], default='pending', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('redriven_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Dead Letters',
+                'db_table': 'dead_letter',
+                'indexes': [models.Index(fields=['status', 'event_timestamp'], name='dead_letter_status_530dd9_idx'), models.Index(fields=['location', 'status'], name='dead_letter_locatio_f744c6_idx')],
+            },
+        ),
+    ]
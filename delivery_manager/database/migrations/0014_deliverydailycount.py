@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0013_deadletter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='database.plantentity')),
+            ],
+            options={
+                'verbose_name_plural': 'Delivery Daily Counts',
+                'db_table': 'delivery_daily_count',
+                'unique_together': {('entity', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-17 16:02
+
+from django.db import migrations, models
+from django.contrib.postgres import operations
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """
+    Build the index without locking delivery_state against the writes of the delivery workers on
+    PostgreSQL; other databases (SQLite in development) build it the plain way.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('database', '0014_deliverydailycount'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='deliverystate',
+            index=models.Index(fields=['entity', '-created_at'], name='delivery_st_entity__331e42_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='deliverystate',
+            index=models.Index(fields=['created_at'], name='delivery_st_created_0e76c2_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='deliverystate',
+            index=models.Index(condition=models.Q(('delivery_status', 'on-going')), fields=['entity'], name='delivery_state_ongoing_idx'),
+        ),
+    ]
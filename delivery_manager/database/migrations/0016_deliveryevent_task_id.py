@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0015_deliverystate_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryevent',
+            name='task_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
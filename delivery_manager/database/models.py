@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class PlantInfo(models.Model):
     """
@@ -119,6 +120,7 @@ class DeliveryEvent(models.Model):
     - event_source (CharField): The source of the event, indicating what or who triggered the event. Max length is set to 250 characters.
     - event_cause (CharField): The cause of the event, providing a brief explanation or reason. Max length is set to 250 characters.
     - description (CharField): A detailed description of the event. Max length is set to 250 characters.
+    - task_id (CharField): The id of the task that recorded the event, unique so that retries and re-drives of the task record it only once.
 
     The Meta class defines the database table name 'events' and sets a verbose name in plural form 'Events'.
     The __str__ method returns a string representation of the event, combining the event ID, event source, event cause, and the description, providing a comprehensive overview and making it easily identifiable and readable, especially useful in admin interfaces or when queried.
@@ -132,6 +134,7 @@ class DeliveryEvent(models.Model):
     status = models.CharField(max_length=255)
     description = models.CharField(max_length=250, null=True, blank=True)
     meta_info = models.JSONField(null=True, blank=True)
+    task_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
 
 
     class Meta:
@@ -169,7 +172,124 @@ class DeliveryState(models.Model):
     class Meta:
         db_table = 'delivery_state'
         verbose_name_plural = 'Delivery State'
+        indexes = [
+            models.Index(fields=['entity', '-created_at']),  # Last delivery of a gate, deliveries of a gate in a date range
+            models.Index(fields=['created_at']),  # Deliveries of all gates in a date range
+            models.Index(fields=['entity'], condition=models.Q(delivery_status='on-going'), name='delivery_state_ongoing_idx'),  # Open deliveries
+        ]
     
     def __str__(self):
         return f'Delivery at {self.delivery_location} at {self.created_at}'
 
+
+
+class SyncOutbox(models.Model):
+    """
+    Represents a notification waiting to be shipped to edge-cloud-sync. Rows are written in the same transaction
+    as the DeliveryState change they describe, and shipped later by the `drain_sync_outbox` command.
+
+    Attributes:
+        - event_id (CharField): The id of the delivery the notification is about.
+        - payload (JSONField): The body posted to edge-cloud-sync.
+        - status (CharField): 'pending' until shipped, then 'sent', or 'failed' once the retries are exhausted.
+        - attempts (PositiveIntegerField): The number of failed shipping attempts.
+        - next_attempt_at (DateTimeField): The earliest time of the next shipping attempt.
+        - last_error (TextField): The error of the last failed attempt.
+        - created_at (DateTimeField): When the notification was written.
+        - sent_at (DateTimeField): When the notification was shipped.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(max_length=50, default='pending', choices=STATUS_CHOICES)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'sync_outbox'
+        verbose_name_plural = 'Sync Outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['event_id', 'status']),
+        ]
+
+    def __str__(self):
+        return f'Sync of {self.event_id} ({self.status})'
+
+
+class DeadLetter(models.Model):
+    """
+    Represents a delivery task that failed after exhausting its retries, kept with its payload so it can be re-driven.
+
+    Attributes:
+        - task_id (CharField): The id of the failed task, reused when it is re-driven.
+        - task_name (CharField): The name of the failed task.
+        - location (CharField): The gate of the event, when the payload tells it.
+        - event_timestamp (DateTimeField): The timestamp of the event, used to re-drive the events of a gate in order.
+        - payload (JSONField): The first argument of the task, i.e. the encoded event or the side-effects job.
+        - error (TextField): The error of the last attempt.
+        - retries (PositiveIntegerField): The number of retries of the last attempt.
+        - status (CharField): 'pending' until re-driven, then 'redriven'.
+        - created_at (DateTimeField): When the task first landed in the dead letters.
+        - updated_at (DateTimeField): When the task last failed or was re-driven.
+        - redriven_at (DateTimeField): When the task was last re-driven.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('redriven', 'Redriven'),
+    ]
+
+    task_id = models.CharField(max_length=255, unique=True)
+    task_name = models.CharField(max_length=255)
+    location = models.CharField(max_length=255, null=True, blank=True)
+    event_timestamp = models.DateTimeField(null=True, blank=True)
+    payload = models.JSONField()
+    error = models.TextField(null=True, blank=True)
+    retries = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=50, default='pending', choices=STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    redriven_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'dead_letter'
+        verbose_name_plural = 'Dead Letters'
+        indexes = [
+            models.Index(fields=['status', 'event_timestamp']),
+            models.Index(fields=['location', 'status']),
+        ]
+
+    def __str__(self):
+        return f'{self.task_name}[{self.task_id}] ({self.status})'
+
+
+class DeliveryDailyCount(models.Model):
+    """
+    Represents the number of deliveries created at a gate on a UTC day, so delivery lists can be counted
+    without scanning every delivery of the range. Totals of all gates are summed from the rows of the gates.
+    Rows are maintained by the DeliveryState save/delete signals (see database.delivery_counts).
+
+    Attributes:
+        - entity (ForeignKey): The gate.
+        - day (DateField): The UTC day the deliveries were created.
+        - count (PositiveIntegerField): The number of deliveries.
+    """
+    entity = models.ForeignKey(PlantEntity, on_delete=models.CASCADE)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'delivery_daily_count'
+        verbose_name_plural = 'Delivery Daily Counts'
+        unique_together = ('entity', 'day')  # Ensure one count per gate and day
+
+    def __str__(self):
+        return f'{self.count} deliveries at {self.entity} on {self.day}'
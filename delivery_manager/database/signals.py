@@ -0,0 +1,24 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from .models import PlantInfo, EntityType, PlantEntity, Camera, DeliveryState
+from .topology import topology_cache
+from .delivery_counts import record_delivery
+
+
+@receiver([post_save, post_delete], sender=PlantInfo)
+@receiver([post_save, post_delete], sender=EntityType)
+@receiver([post_save, post_delete], sender=PlantEntity)
+@receiver([post_save, post_delete], sender=Camera)
+def invalidate_topology_cache(sender, **kwargs):
+    topology_cache.invalidate()
+
+
+@receiver(post_save, sender=DeliveryState)
+def count_created_delivery(sender, instance, created, **kwargs):
+    if created:
+        record_delivery(instance.entity_id, instance.created_at)
+
+
+@receiver(post_delete, sender=DeliveryState)
+def count_deleted_delivery(sender, instance, **kwargs):
+    record_delivery(instance.entity_id, instance.created_at, delta=-1)
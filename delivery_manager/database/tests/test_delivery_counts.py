@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from django.test import TestCase
+from database.models import PlantInfo, EntityType, PlantEntity, DeliveryState, DeliveryDailyCount
+from database.delivery_counts import count_deliveries
+
+
+class DeliveryCountsTest(TestCase):
+    """
+    Daily counts are kept per gate only, and totals of all gates are summed from them.
+    """
+
+    def setUp(self):
+        plant = PlantInfo.objects.create(plant_id='plant', plant_name='plant', plant_location='here')
+        entity_type = EntityType.objects.create(plant=plant, entity_type='gate')
+        self.gates = [
+            PlantEntity.objects.create(entity_type=entity_type, entity_uid=f"gate{index:02d}", description='gate')
+            for index in range(3)
+        ]
+        self.now = datetime.now(timezone.utc)
+
+    def create_delivery(self, gate, created_at):
+        delivery = DeliveryState.objects.create(
+            entity=gate, delivery_id=f"{gate.entity_uid}-{DeliveryState.objects.count()}",
+            delivery_start=created_at, delivery_location=gate.entity_uid,
+        )
+        DeliveryState.objects.filter(pk=delivery.pk).update(created_at=created_at)
+
+    def exact(self, from_date, to_date, gate=None):
+        deliveries = DeliveryState.objects.filter(created_at__range=(from_date, to_date))
+        return deliveries.filter(entity=gate).count() if gate else deliveries.count()
+
+    def test_totals_are_summed_from_the_counts_of_the_gates(self):
+        for days_ago in range(10):
+            for index, gate in enumerate(self.gates):
+                for _ in range((days_ago + index) % 3):
+                    self.create_delivery(gate, self.now - timedelta(days=days_ago, hours=1))
+        DeliveryDailyCount.objects.all().delete()
+
+        from_date, to_date = self.now - timedelta(days=9, hours=12), self.now
+        exact = self.exact(from_date, to_date)
+        self.assertEqual(count_deliveries(from_date, to_date), exact)
+        self.assertFalse(DeliveryDailyCount.objects.filter(entity__isnull=True).exists())
+
+        with self.assertNumQueries(4):
+            self.assertEqual(count_deliveries(from_date, to_date), exact)
+        for gate in self.gates:
+            self.assertEqual(count_deliveries(from_date, to_date, entity_id=gate.id), self.exact(from_date, to_date, gate))
+
+    def test_a_delivery_updates_the_count_of_its_gate_only(self):
+        self.create_delivery(self.gates[0], self.now)
+        self.create_delivery(self.gates[0], self.now)
+        self.create_delivery(self.gates[1], self.now)
+
+        counts = dict(DeliveryDailyCount.objects.values_list('entity_id', 'count'))
+        self.assertEqual(counts, {self.gates[0].id: 2, self.gates[1].id: 1})
@@ -0,0 +1,81 @@
+from unittest import skipUnless
+from datetime import datetime, timedelta, timezone
+from django.db import connection
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.test import TestCase
+from database.models import PlantInfo, EntityType, PlantEntity
+from database.delivery_queries import (
+    delivery_list, deliveries_between, deliveries_created, deliveries_after, last_deliveries, on_going_deliveries,
+)
+
+DELIVERIES = 200000
+GATES = 20
+DAYS = 365
+
+
+@skipUnless(connection.vendor == 'postgresql', "query plans are only checked on PostgreSQL")
+class DeliveryQueryPlansTest(TestCase):
+    """
+    Explain the DeliveryState access paths of the endpoints and the delivery worker on a large seeded
+    table, and fail on any sequential scan of delivery_state, so an index regression fails here
+    instead of slowing production.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        plant = PlantInfo.objects.create(plant_id='plans', plant_name='plans', plant_location='plans')
+        entity_type = EntityType.objects.create(plant=plant, entity_type='gate')
+        entities = PlantEntity.objects.bulk_create(
+            [PlantEntity(entity_type=entity_type, entity_uid=f'plans-gate{gate:02d}', description='plans') for gate in range(GATES)]
+        )
+        cls.entity_id = entities[0].id
+
+        # One delivery every few minutes per gate over DAYS; the last delivery of each gate is on-going.
+        step = DAYS * 86400 / DELIVERIES
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO delivery_state (entity_id, delivery_id, delivery_start, delivery_end, delivery_status, delivery_location, created_at)
+                SELECT
+                    (%s::bigint[])[1 + i %% %s],
+                    'plans-' || i,
+                    now() - (i * %s * interval '1 second'),
+                    now() - (i * %s * interval '1 second') + interval '2 minutes',
+                    CASE WHEN i < %s THEN 'on-going' ELSE 'done' END,
+                    'plans-gate',
+                    now() - (i * %s * interval '1 second')
+                FROM generate_series(0, %s - 1) AS i
+                """,
+                [[entity.id for entity in entities], GATES, step, step, GATES, step, DELIVERIES],
+            )
+            cursor.execute("ANALYZE delivery_state")
+
+    def assertIndexScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan on delivery_state', plan, plan)
+
+    def test_delivery_queries_use_an_index(self):
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        day = (today - timedelta(days=7), today - timedelta(days=6))
+        last = last_deliveries(self.entity_id).first()
+
+        queries = {
+            'get_delivery (gate, day)': delivery_list(*day, entity_id=self.entity_id)[:15],
+            'get_delivery (all gates, day)': delivery_list(*day)[:15],
+            'get_delivery (gate, cursor)': deliveries_after(
+                delivery_list(today - timedelta(days=90), today, entity_id=self.entity_id), last.created_at, last.id
+            )[:16],
+            'export_deliveries (gate, day)': deliveries_between(*day, self.entity_id).order_by('created_at', 'id'),
+            'count_deliveries (gate, day)': deliveries_created(*day, self.entity_id),
+            'count_deliveries (all gates, days)': deliveries_created(*day)
+                .annotate(day=TruncDate('created_at', tzinfo=timezone.utc))
+                .values('entity', 'day')
+                .annotate(count=Count('id')),
+            'get_gate_status, create_delivery (last delivery of gate)': last_deliveries(self.entity_id)[:1],
+            'rehydrate_state_machines (on-going deliveries)': on_going_deliveries(),
+        }
+
+        for name, queryset in queries.items():
+            with self.subTest(name):
+                self.assertIndexScan(queryset)
@@ -0,0 +1,50 @@
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+from utils.cache import TTLCache
+from .models import PlantEntity
+
+
+@dataclass(frozen=True)
+class GateTopology:
+    """
+    The configuration of a gate needed to process its events.
+
+    Attributes:
+        - entity_id (int): The primary key of the PlantEntity.
+        - entity_uid (str): The unique identifier of the gate.
+        - tenant_domain (str): The domain of the plant the gate belongs to.
+        - topics (list): The stream topics of the cameras watching the gate.
+    """
+    entity_id: int
+    entity_uid: str
+    tenant_domain: Optional[str]
+    topics: List[str] = field(default_factory=list)
+
+
+class TopologyCache(TTLCache):
+    """
+    In-process cache of the gate topology (PlantEntity, tenant domain and cameras), keyed by entity_uid.
+
+    The topology of a gate is loaded with one joined query plus one camera query, and dropped by the
+    save/delete signals of PlantInfo, EntityType, PlantEntity and Camera (see database.signals).
+    `get` returns None for an unknown entity_uid.
+    """
+    def load(self, entity_uid):
+        plant_entity = (
+            PlantEntity.objects.select_related('entity_type__plant')
+            .filter(entity_uid=entity_uid)
+            .first()
+        )
+        if plant_entity is None:
+            return None
+
+        return GateTopology(
+            entity_id=plant_entity.id,
+            entity_uid=plant_entity.entity_uid,
+            tenant_domain=plant_entity.entity_type.plant.domain,
+            topics=list(plant_entity.cameras.values_list('stream_topic', flat=True)),
+        )
+
+
+topology_cache = TopologyCache(ttl=float(os.getenv('TOPOLOGY_CACHE_TTL', 300)))
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+import threading
+from celery import current_app
+from utils.sqlite_store import SQLiteStore, store_path
+from events_api.config.celery_config import DELIVERY_PARTITIONS, delivery_partition
+
+ADMITTED = 'admitted'
+THROTTLED = 'throttled'
+UNAVAILABLE = 'unavailable'
+SHED = 'shed'
+
+
+def delivery_queue(location):
+    return f"delivery.{delivery_partition(location)}"
+
+
+class ConsumerLag(SQLiteStore):
+    """
+    How far behind the delivery workers are, per partition queue: the age of the last event they applied.
+
+    Recorded by the workers, at most once every `interval` seconds per queue, and read by the events API.
+
+    Attributes:
+        - interval (float): The minimum number of seconds between two records of a queue.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS consumer_lag (queue TEXT PRIMARY KEY, lag REAL NOT NULL, applied_at REAL NOT NULL)",
+    ]
+
+    def __init__(self, path, interval=1.0):
+        super().__init__(path)
+        self.interval = interval
+        self.recorded = {}
+
+    def record(self, queue, lag):
+        now = time.time()
+        if now - self.recorded.get(queue, 0) < self.interval:
+            return
+        self.recorded[queue] = now
+        try:
+            self.connection().execute(
+                "INSERT OR REPLACE INTO consumer_lag (queue, lag, applied_at) VALUES (?, ?, ?)", (queue, lag, now)
+            )
+        except Exception as err:
+            logging.error(f"Error recording the lag of {queue}: {err}")
+
+    def get(self):
+        """
+        :return: A mapping of queue name to a (lag, applied_at) tuple
+        """
+        rows = self.connection().execute("SELECT queue, lag, applied_at FROM consumer_lag").fetchall()
+        return {queue: (lag, applied_at) for queue, lag, applied_at in rows}
+
+
+class AdmissionControl:
+    """
+    Tracks the depth, consumers and lag of the delivery partition queues and tells whether a gate can take more events.
+
+    Depth and consumers come from a passive queue_declare of every partition queue, refreshed at most every
+    `interval` seconds by one request while the others use the last figures. The lag of a queue is the age of
+    the last event its worker applied, growing with the time since that event while messages are waiting.
+    A queue without consumers is UNAVAILABLE, a queue above `max_depth` messages or `max_lag` seconds of lag
+    is THROTTLED. When the broker cannot be queried, events are admitted and publishing reports the error.
+
+    Attributes:
+        - consumer_lag (ConsumerLag): The lag recorded by the workers.
+        - max_depth (int): The queue depth above which a queue is throttled, 0 to disable.
+        - max_lag (float): The lag in seconds above which a queue is throttled, 0 to disable.
+        - interval (float): The number of seconds the queue figures are reused.
+    """
+    def __init__(self, consumer_lag, max_depth=0, max_lag=0, interval=2.0):
+        self.consumer_lag = consumer_lag
+        self.max_depth = max_depth
+        self.max_lag = max_lag
+        self.interval = interval
+        self.stats = {}
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        if time.monotonic() - self.refreshed_at < self.interval or not self.lock.acquire(blocking=False):
+            return
+
+        try:
+            stats = {}
+            with current_app.connection_for_read() as conn:
+                channel = conn.default_channel
+                for partition in range(DELIVERY_PARTITIONS):
+                    name = f"delivery.{partition}"
+                    _, depth, consumers = channel.queue_declare(queue=name, passive=True)
+                    stats[name] = {'depth': depth, 'consumers': consumers, 'lag': 0.0}
+
+            now = time.time()
+            for name, (lag, applied_at) in self.consumer_lag.get().items():
+                if name in stats:
+                    stats[name]['lag'] = max(lag, now - applied_at) if stats[name]['depth'] else lag
+
+            self.stats = stats
+        except Exception as err:
+            logging.error(f"Error reading the delivery queues: {err}")
+        finally:
+            self.refreshed_at = time.monotonic()
+            self.lock.release()
+
+    def check(self, location):
+        """
+        :return: ADMITTED, THROTTLED or UNAVAILABLE for the queue of the gate
+        """
+        self.refresh()
+        stats = self.stats.get(delivery_queue(location))
+        if stats is None:
+            return ADMITTED
+
+        if stats['consumers'] == 0:
+            return UNAVAILABLE
+
+        if (self.max_depth and stats['depth'] >= self.max_depth) or (self.max_lag and stats['lag'] >= self.max_lag):
+            return THROTTLED
+
+        return ADMITTED
+
+    def queues(self):
+        self.refresh()
+        return dict(self.stats)
+
+
+consumer_lag = ConsumerLag(
+    path=os.getenv('CONSUMER_LAG_STORE_PATH', store_path('consumer_lag.sqlite3')),
+)
+
+admission_control = AdmissionControl(
+    consumer_lag,
+    max_depth=int(os.getenv('ADMISSION_MAX_QUEUE_DEPTH', 1000)),
+    max_lag=float(os.getenv('ADMISSION_MAX_LAG', 60)),
+    interval=float(os.getenv('ADMISSION_CHECK_INTERVAL', 2)),
+)
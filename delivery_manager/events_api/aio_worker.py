@@ -0,0 +1,299 @@
+"""
+Asyncio worker mode of the delivery pipeline, an alternative to the prefork celery workers.
+
+One process consumes the delivery partition queues (and optionally delivery_io) and keeps hundreds of
+events in flight: the events of each gate go through their own asyncio queue and are applied one after
+another, while different gates are applied concurrently. The blocking Django ORM work of an event runs
+through `sync_to_async` on a bounded thread pool (AIO_DB_CONCURRENCY threads, hence as many database
+connections), and the video requests of the side effects use a shared httpx.AsyncClient.
+
+kombu channels are not thread safe, so the messages are received and acknowledged by a single consumer
+thread; the asyncio loop hands finished messages back to it. Only JSON task messages are accepted, the
+others are rejected with a log line. Events are applied in queue order, the EVENT_LATENESS reorder
+buffer of the prefork workers is not used in this mode. A failed event is retried in place, holding the
+events of its gate behind it and its message unacknowledged, then dead-lettered after MAX_RETRIES.
+
+Run it from the events_api directory, instead of (never next to) the celery_delivery workers:
+
+    python3 aio_worker.py -Q delivery.0,delivery.1,delivery.2,delivery.3
+"""
+import os
+import queue
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from kombu import Connection, Consumer, Queue
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from celery.app.task import Context
+from events_api.config.celery_utils import create_celery
+from events_api.config.celery_config import DELIVERY_PARTITIONS, consumed_partitions
+from events_api.tasks.delivery import log_delivery, side_effects
+from events_api.tasks.delivery.wire import decode_event, event_location
+from events_api.tasks.delivery.dead_letter import dead_letter
+from utils.media import request_video
+from utils.api.dispatcher import target
+
+AIO_PREFETCH = int(os.getenv('AIO_PREFETCH', 500))
+AIO_DB_CONCURRENCY = int(os.getenv('AIO_DB_CONCURRENCY', 32))
+AIO_HTTP_CONCURRENCY = int(os.getenv('AIO_HTTP_CONCURRENCY', 100))
+AIO_SHUTDOWN_TIMEOUT = float(os.getenv('AIO_SHUTDOWN_TIMEOUT', 30))
+AIO_RETRY_BACKOFF = float(os.getenv('AIO_RETRY_BACKOFF', 1))
+MAX_RETRIES = 5
+
+
+def handle_event(event, task_id, retries):
+    """
+    Apply an event on a thread of the pool, dropping the broken or expired database connection of the
+    thread before and after, as celery does around every task.
+    """
+    close_old_connections()
+    try:
+        return log_delivery.handle_event(event, task_id=task_id, retries=retries)
+    finally:
+        close_old_connections()
+
+
+class AioWorker:
+    """
+    Consumes celery task messages of the delivery pipeline and runs them on an asyncio loop.
+
+    Attributes:
+        - app (Celery): The celery app, for the broker connection, the retries and the results.
+        - queues (list): The names of the queues to consume.
+        - prefetch (int): The maximum number of unacknowledged messages, i.e. of events in flight.
+    """
+    def __init__(self, app, queues, prefetch=AIO_PREFETCH):
+        self.app = app
+        self.queues = queues
+        self.prefetch = prefetch
+        self.loop = None
+        self.http = None
+        self.gates = {}
+        self.tasks = set()
+        self.settled = queue.Queue()
+        self.pending = 0
+        self.stopping = threading.Event()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=AIO_DB_CONCURRENCY, thread_name_prefix='aio_worker'))
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(signum, self.stopping.set)
+
+        await asyncio.to_thread(log_delivery.rehydrate_state_machines, partitions=consumed_partitions(self.queues))
+        self.http = httpx.AsyncClient(limits=httpx.Limits(max_connections=AIO_HTTP_CONCURRENCY))
+        print(f"Asyncio worker consuming {', '.join(self.queues)}")
+        try:
+            await asyncio.to_thread(self.consume)
+        finally:
+            await self.http.aclose()
+            await asyncio.to_thread(log_delivery.flush_delivery_events)
+
+    def consume(self):
+        """
+        Consumer thread: receive the messages and acknowledge the ones the loop is done with.
+
+        On shutdown it stops receiving and waits up to AIO_SHUTDOWN_TIMEOUT seconds for the events in
+        flight, unacknowledged messages are redelivered by the broker.
+        """
+        with Connection(self.app.conf.broker_url) as conn:
+            queues = [Queue(name) for name in self.queues]
+            with Consumer(
+                conn, queues=queues, callbacks=[self.on_message], prefetch_count=self.prefetch,
+                accept=['json'], on_decode_error=self.on_decode_error,
+            ) as consumer:
+                while not self.stopping.is_set():
+                    self.settle()
+                    try:
+                        conn.drain_events(timeout=0.1)
+                    except socket.timeout:
+                        pass
+
+                consumer.cancel()
+                deadline = self.loop.time() + AIO_SHUTDOWN_TIMEOUT
+                while self.pending and self.loop.time() < deadline:
+                    self.settle(timeout=0.1)
+
+    def settle(self, timeout=None):
+        """
+        Acknowledge the messages the loop is done with, or give back to the broker those it could not handle.
+        """
+        try:
+            message, done = self.settled.get(timeout=timeout) if timeout else self.settled.get_nowait()
+            while True:
+                message.ack() if done else message.requeue()
+                self.pending -= 1
+                message, done = self.settled.get_nowait()
+        except queue.Empty:
+            pass
+
+    def on_decode_error(self, message, err):
+        """
+        Reject the messages the worker cannot decode, e.g. pickled tasks of an older events API: they are
+        dropped (or dead-lettered by the broker) instead of stopping the consumer.
+        """
+        logging.error(f"Rejected message {message.headers.get('id')} of task {message.headers.get('task')} ({message.content_type}): {err}")
+        message.reject()
+
+    def on_message(self, body, message):
+        self.pending += 1
+        self.loop.call_soon_threadsafe(self.dispatch, body, message)
+
+    def dispatch(self, body, message):
+        """
+        Hand a message to the queue of its gate, side-effects jobs start at once (a stop waits for its start).
+        """
+        args, kwargs, _ = body
+        name = message.headers.get('task')
+        if name == log_delivery.create_delivery.name:
+            location = event_location(args[0])
+            if location not in self.gates:
+                self.gates[location] = asyncio.Queue()
+                self.spawn(self.run_gate(self.gates[location]))
+            self.gates[location].put_nowait((name, args, message))
+        else:
+            self.spawn(self.run_message(name, args, message))
+
+    def spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_gate(self, messages):
+        while True:
+            name, args, message = await messages.get()
+            await self.run_message(name, args, message)
+
+    async def run_message(self, name, args, message):
+        task_id = message.headers['id']
+        retries = message.headers.get('retries') or 0
+        done = True
+        request = Context(
+            id=task_id,
+            reply_to=message.properties.get('reply_to'),
+            correlation_id=message.properties.get('correlation_id'),
+        )
+
+        try:
+            while True:
+                try:
+                    result = await self.run_task(name, args, task_id, retries)
+                    break
+                except Exception as err:
+                    # The event is retried before the next events of its gate, which wait in the queue of the gate.
+                    if name != log_delivery.create_delivery.name or retries >= MAX_RETRIES:
+                        raise
+                    logging.error(f"Error in task {name}[{task_id}], retrying in place: {err}")
+                    await asyncio.sleep(AIO_RETRY_BACKOFF * 2 ** retries)
+                    retries += 1
+            await self.store_result(self.app.backend.mark_as_done, task_id, result, request=request)
+
+        except Exception as err:
+            logging.error(f"Error in task {name}[{task_id}]: {err}")
+            task = self.app.tasks.get(name)
+            if task is not None and retries < MAX_RETRIES:
+                try:
+                    await asyncio.to_thread(
+                        task.apply_async, args=args, task_id=task_id, retries=retries + 1, countdown=2 ** retries
+                    )
+                except Exception as publish_err:
+                    logging.error(f"Error scheduling the retry of task {task_id}: {publish_err}")
+                    done = False
+            else:
+                await self.store_result(self.app.backend.mark_as_failure, task_id, err, request=request)
+                if task is not None:
+                    await asyncio.to_thread(dead_letter, name, task_id, args[0], err, retries=retries)
+
+        finally:
+            self.settled.put((message, done))
+
+    async def run_task(self, name, args, task_id, retries):
+        if name == log_delivery.create_delivery.name:
+            return await self.create_delivery(args[0], task_id, retries)
+        if name == side_effects.run_side_effects.name:
+            return await self.run_side_effects(args[0], task_id, retries)
+        raise ValueError(f"Task {name} is not served by the asyncio worker")
+
+    async def store_result(self, mark, task_id, result, request):
+        if not request.reply_to:
+            return
+        try:
+            await asyncio.to_thread(mark, task_id, result, request=request)
+        except Exception as err:
+            logging.error(f"Error storing the result of task {task_id}: {err}")
+
+    async def create_delivery(self, payload, task_id, retries):
+        event = decode_event(payload)
+        return await sync_to_async(handle_event, thread_sensitive=False)(event, task_id=task_id, retries=retries)
+
+    async def run_side_effects(self, job, task_id, retries):
+        """
+        Serve a `run_side_effects` job; like the celery task, the stop of a delivery waits for its start.
+        """
+        transition = job["transition"]
+        if transition == 'stop' and retries < MAX_RETRIES and await asyncio.to_thread(side_effects.start_pending, job):
+            raise side_effects.StartPending(f"Start of delivery {job['delivery_id']} not completed yet")
+
+        video_requests = [
+            (f"http://{side_effects.MediaManager_API}:18042/api/v1/event/rt_video/{transition}",
+             job["params"], side_effects.MEDIA_MANAGER_TIMEOUT),
+        ]
+        if job.get("external_params") and side_effects.EXTERNAL_MEDIA_MANAGER_API_ROUTE:
+            video_requests.append(
+                (f"{side_effects.EXTERNAL_MEDIA_MANAGER_API_ROUTE}/api/v1/event/rt_video/{transition}",
+                 job["external_params"], side_effects.EXTERNAL_MEDIA_MANAGER_TIMEOUT)
+            )
+
+        await asyncio.gather(
+            *(self.send_video_request(f"{job['task_id']}:{url}", url, params, timeout) for url, params, timeout in video_requests)
+        )
+        await asyncio.to_thread(side_effects.release_stop, job)
+
+        return {"action": "done", "task_id": task_id, "result": f"Side effects of delivery {transition} of task {job['task_id']} done"}
+
+    async def send_video_request(self, key, url, params, timeout):
+        """
+        Send a video request unless it was completed before under `key`, as `completed_side_effects.once` does.
+        """
+        try:
+            if await asyncio.to_thread(side_effects.completed_side_effects.seen, key):
+                return None
+        except Exception as err:
+            logging.error(f"Error reading idempotency key {key}: {err}")
+
+        result = await request_video.send_request_async(
+            url=url,
+            params=params,
+            client=self.http,
+            timeout=timeout,
+            breaker=side_effects.media_breakers.breaker(target(url)),
+        )
+        if result is not None:
+            try:
+                await asyncio.to_thread(side_effects.completed_side_effects.claim, key)
+            except Exception as err:
+                logging.error(f"Error recording idempotency key {key}: {err}")
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio worker of the delivery pipeline")
+    parser.add_argument(
+        '-Q', '--queues',
+        default=','.join(f"delivery.{partition}" for partition in range(DELIVERY_PARTITIONS)),
+        help="Comma separated queues to consume, all delivery partitions by default",
+    )
+    parser.add_argument('--prefetch', type=int, default=AIO_PREFETCH, help="Maximum number of events in flight")
+    args = parser.parse_args()
+
+    asyncio.run(AioWorker(create_celery(), args.queues.split(','), prefetch=args.prefetch).serve())
+
+
+if __name__ == "__main__":
+    main()
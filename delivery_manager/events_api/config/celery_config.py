@@ -1,12 +1,49 @@
 import os
+import zlib
 import celery
 from functools import lru_cache
 from kombu import Queue
+from events_api.tasks.delivery.wire import event_location
+
+# Delivery events are spread over DELIVERY_PARTITIONS queues (delivery.0 ... delivery.N-1) by a stable
+# hash of the gate, each consumed by a single worker process with concurrency 1: gates are processed in
+# parallel while the events of one gate stay strictly ordered.
+#
+# Adding a gate never moves the existing ones, as the hash only depends on the gate itself. Gates can be
+# pinned to a partition with DELIVERY_PARTITION_MAP, e.g. "gate03:0,gate04:1", to balance busy gates by
+# hand. Changing DELIVERY_PARTITIONS moves gates between queues: stop the events API, let the partition
+# queues drain, then restart the API and the workers (supervisord numprocs must match).
+DELIVERY_PARTITIONS = int(os.getenv('DELIVERY_PARTITIONS', 4))
+DELIVERY_PARTITION_MAP = {
+    gate.strip(): int(partition)
+    for gate, partition in (
+        item.split(':') for item in os.getenv('DELIVERY_PARTITION_MAP', '').split(',') if ':' in item
+    )
+}
+
+def delivery_partition(location):
+    if location in DELIVERY_PARTITION_MAP:
+        return DELIVERY_PARTITION_MAP[location] % DELIVERY_PARTITIONS
+    return zlib.crc32(str(location).encode()) % DELIVERY_PARTITIONS
+
+def consumed_partitions(queues):
+    """
+    Return the delivery partitions among the names of the queues consumed by a worker, e.g. {0, 2}
+    for "delivery.0" and "delivery.2".
+    """
+    return {
+        int(name.rpartition('.')[2])
+        for name in queues
+        if name.startswith('delivery.') and name.rpartition('.')[2].isdigit()
+    }
 
 def route_task(name, args, kwargs, options, task=None, **kw):
     print(name)
     if ":" in name:
         queue, _ = name.split(":")
+        location = event_location(args[0]) if args else None
+        if queue == "delivery" and location is not None:
+            return {"queue": f"delivery.{delivery_partition(location)}"}
         return {"queue": queue}
     return {"queue": "celery"}
 
@@ -21,12 +58,17 @@ class BaseConfig:
         # default queue
         Queue("celery"),
         # custom queue
+        *(Queue(f"delivery.{partition}") for partition in range(DELIVERY_PARTITIONS)),
+        # side effects of the delivery transitions (video recordings), kept off the delivery queues
+        Queue("delivery_io"),
+        # delivery tasks that exhausted their retries, persisted as DeadLetter rows
+        Queue("delivery_dead"),
     )
 
     CELERY_TASK_ROUTES = (route_task,)
     ACCEPT_CONTENT = ['json', 'pickle']
-    TASK_SERIALIZE = 'pickle'
-    RESULT_SERIALIZE = 'pickle'
+    TASK_SERIALIZE = 'json'
+    RESULT_SERIALIZE = 'json'
     TIMEZONE = 'UTC'
     ENABLE_UTC = True 
 
@@ -0,0 +1,147 @@
+import os
+import zlib
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class PublisherBusy(Exception):
+    """
+    Raised when the publish queue is full, i.e. the broker does not keep up with the incoming events.
+    """
+
+
+class TaskPublisher:
+    """
+    Publishes celery tasks from dedicated threads, so that the AMQP round-trips never block the event loop.
+
+    Publish requests are spread over `threads` publisher threads by their key (the gate of the event),
+    each with its own bounded queue and pooled producer: a slow broker round-trip only holds back the
+    gates of its thread, while the tasks of one gate are still published in order. When the queue of a
+    thread is full, `publish` fails fast with PublisherBusy instead of piling up requests. Every thread
+    drains whatever is queued for it, and every caller awaits the futures of its own tasks.
+
+    Attributes:
+        - maxsize (int): The number of publish requests that can wait for each publisher thread.
+        - max_batch (int): The number of publish requests sent over one producer acquisition.
+        - threads (int): The number of publisher threads.
+    """
+    def __init__(self, maxsize=1000, max_batch=100, threads=4):
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in range(threads)]
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.threads = []
+        self.pid = None
+
+    def ensure_started(self):
+        if self.pid == os.getpid() and all(thread.is_alive() for thread in self.threads):
+            return
+
+        with self.lock:
+            if self.pid == os.getpid() and all(thread.is_alive() for thread in self.threads):
+                return
+            self.pid = os.getpid()
+            self.threads = [
+                threading.Thread(target=self.run, args=(publish_queue,), name=f"TaskPublisher-{index}", daemon=True)
+                for index, publish_queue in enumerate(self.queues)
+            ]
+            for thread in self.threads:
+                thread.start()
+
+    def queue_of(self, key):
+        return self.queues[zlib.crc32(str(key).encode()) % len(self.queues)]
+
+    def submit(self, task, calls, keys):
+        """
+        Queue the publication of one or more tasks, all of them or none.
+
+        :param task: The celery task to publish
+        :param calls: A list of (args, options) tuples, one per task message
+        :param keys: The key of each call; the calls of a key are published in order by the same thread
+        :return: A list of (Future, indexes) tuples, each Future resolving to the task ids of the calls at `indexes`
+        """
+        self.ensure_started()
+        batches = {}
+        for index, key in enumerate(keys):
+            batches.setdefault(id(self.queue_of(key)), (self.queue_of(key), []))[1].append(index)
+
+        # Requests are only added under the lock and the threads only remove them, so a queue found
+        # with room below cannot fill up before the requests are added.
+        with self.lock:
+            for publish_queue, _ in batches.values():
+                if publish_queue.full():
+                    raise PublisherBusy(f"Publish queue is full ({publish_queue.maxsize} pending requests)")
+
+            submitted = []
+            for publish_queue, indexes in batches.values():
+                future = Future()
+                publish_queue.put_nowait((task, [calls[index] for index in indexes], future))
+                submitted.append((future, indexes))
+
+        return submitted
+
+    async def publish(self, task, args, key=None, **options):
+        """
+        Publish one task without blocking the event loop.
+
+        :param key: The gate of the task, None to publish it from the first thread
+        :return: The task id
+        """
+        (future, _), = self.submit(task, [(args, options)], [key])
+        task_ids = await asyncio.wrap_future(future)
+        return task_ids[0]
+
+    async def publish_many(self, task, calls, keys=None):
+        """
+        Publish several tasks without blocking the event loop; the tasks of each key are sent in order.
+
+        :param keys: The gate of each call, None to publish them all from the first thread
+        :return: The task ids, in the order of `calls`
+        """
+        submitted = self.submit(task, calls, keys or [None] * len(calls))
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future, _ in submitted))
+
+        task_ids = [None] * len(calls)
+        for (_, indexes), batch_ids in zip(submitted, results):
+            for index, task_id in zip(indexes, batch_ids):
+                task_ids[index] = task_id
+        return task_ids
+
+    def run(self, publish_queue):
+        while True:
+            jobs = [publish_queue.get()]
+            while len(jobs) < self.max_batch:
+                try:
+                    jobs.append(publish_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.publish_jobs(jobs)
+
+    def publish_jobs(self, jobs):
+        try:
+            with jobs[0][0].app.producer_or_acquire() as producer:
+                for task, calls, future in jobs:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        task_ids = [task.apply_async(args=args, producer=producer, **options).id for args, options in calls]
+                    except Exception as err:
+                        future.set_exception(err)
+                    else:
+                        future.set_result(task_ids)
+        except Exception as err:
+            for _, _, future in jobs:
+                if not future.done():
+                    future.set_exception(err)
+
+    def __len__(self):
+        return sum(publish_queue.qsize() for publish_queue in self.queues)
+
+
+publisher = TaskPublisher(
+    maxsize=int(os.getenv('EVENT_PUBLISH_QUEUE_SIZE', 1000)),
+    max_batch=int(os.getenv('EVENT_PUBLISH_BATCH_SIZE', 100)),
+    threads=int(os.getenv('EVENT_PUBLISH_THREADS', 4)),
+)
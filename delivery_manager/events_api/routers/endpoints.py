@@ -1,3 +1,4 @@
+import os
 import json
 import time
 import uuid
@@ -16,9 +17,35 @@ from typing import  List
 from fastapi import Request
 from fastapi import BackgroundTasks
 from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from fastapi import FastAPI, Depends, APIRouter, Request, Header, Response
+from fastapi.responses import PlainTextResponse
 from events_api.tasks.delivery import log_delivery
+from events_api.tasks.delivery.wire import encode_event
+from events_api.tasks.delivery.dead_letter import redrive
+from database.models import DeadLetter
+from events_api.publisher import publisher, PublisherBusy
+from utils.idempotency import IdempotencyStore
+from utils.sqlite_store import store_path
+from utils.coalesce import EventCoalescer, COALESCED, HEARTBEAT
+from events_api.admission import admission_control, ADMITTED, UNAVAILABLE, SHED
+from utils.api.breaker import STATE_VALUES
+
+EVENT_BATCH_MAX_SIZE = int(os.getenv('EVENT_BATCH_MAX_SIZE', 1000))
+PUBLISHER_BUSY_RETRY_AFTER = os.getenv('PUBLISHER_BUSY_RETRY_AFTER', '1')
+ADMISSION_RETRY_AFTER = os.getenv('ADMISSION_RETRY_AFTER', '5')
+
+received_events = IdempotencyStore(
+    path=os.getenv('IDEMPOTENCY_STORE_PATH', store_path('received_events.sqlite3')),
+    ttl=float(os.getenv('IDEMPOTENCY_TTL', 3600)),
+    max_entries=int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 100000)),
+)
+
+event_coalescer = EventCoalescer(
+    path=os.getenv('COALESCER_STORE_PATH', store_path('gate_status.sqlite3')),
+    window=float(os.getenv('COALESCE_WINDOW', 30)),
+)
 
 class TimedRoute(APIRoute):
     def get_route_handler(self) -> Callable:
@@ -60,6 +87,38 @@ class DeliveryEventRequest(BaseModel):
     meta_info: Optional[Dict] = Field(None, description="Additional information in JSON format.")
 
 
+def idempotency_key(event, x_request_id=None):
+    """
+    Key identifying a delivery event across detector retries and network replays.
+    """
+    if x_request_id:
+        return x_request_id
+    return f"{event.location}:{event.event_uid}:{event.status}:{event.timestamp.isoformat()}"
+
+
+def should_shed(event, admission):
+    """
+    Under backpressure, heartbeats are shed; transitions always go through, and repeated statuses are coalesced as usual.
+    """
+    return admission != ADMITTED and event_coalescer.peek(event.location, event.status) == HEARTBEAT
+
+
+def record_coalesced(event, coalesced):
+    """
+    Attach the summary of the events coalesced before an event to its meta_info, where the delivery worker
+    records it with the event: the audit trail of the gate then accounts for the events that were dropped.
+    """
+    if coalesced:
+        event.meta_info = {**(event.meta_info or {}), 'coalesced': coalesced}
+
+
+def shed_status_code(admissions):
+    """
+    429 while the delivery queues are behind, 503 when one of them has no consumer at all.
+    """
+    return 503 if UNAVAILABLE in admissions else 429
+
+
 router = APIRouter(
     prefix="/api/v1",
     tags=["DeliveryAPI"],
@@ -77,8 +136,134 @@ async def create_delivery(
     x_request_id: Annotated[str | None, Header()] = None,
 ) -> dict:
     
-    task = log_delivery.create_delivery.apply_async(args=(event,), task_id=x_request_id)
-    result = {"status": "received", "task_id": task.id, "data": {}}
+    key = idempotency_key(event, x_request_id)
+    if not await run_in_threadpool(received_events.claim, key):
+        return {"status": "duplicate", "task_id": x_request_id or "", "data": {}}
+    
+    admission = await run_in_threadpool(admission_control.check, event.location)
+    if await run_in_threadpool(should_shed, event, admission):
+        await run_in_threadpool(received_events.release, key)
+        response.status_code = shed_status_code([admission])
+        response.headers["Retry-After"] = ADMISSION_RETRY_AFTER
+        return {"status": SHED, "task_id": x_request_id or "", "data": {"error": f"Delivery queue of {event.location} is {admission}"}}
+    
+    decision, coalesced = await run_in_threadpool(event_coalescer.admit, event.location, event.status, event.timestamp.isoformat())
+    if decision == COALESCED:
+        return {"status": "coalesced", "task_id": "", "data": {}}
+    record_coalesced(event, coalesced)
+    
+    try:
+        task_id = await publisher.publish(
+            log_delivery.create_delivery, args=(encode_event(event),), key=event.location, task_id=x_request_id,
+        )
+    except Exception as err:
+        await run_in_threadpool(received_events.release, key)
+        await run_in_threadpool(event_coalescer.forget, event.location, coalesced)
+        if not isinstance(err, PublisherBusy):
+            raise
+        response.status_code = 503
+        response.headers["Retry-After"] = PUBLISHER_BUSY_RETRY_AFTER
+        return {"status": "rejected", "task_id": x_request_id or "", "data": {"error": str(err)}}
+    
+    result = {"status": "received", "task_id": task_id, "data": {}}
+
+    return result
+
+@router.api_route(
+    "/delivery/events/batch", methods=["POST"], tags=["DeliveryAPI"]
+)
+async def create_delivery_batch(
+    response: Response,
+    events: List[DeliveryEventRequest],
+) -> dict:
+    """
+    Endpoint to publish a burst of delivery events in one request.
+
+    The events are validated in one pass and handed to the publisher as one request,
+    whose threads send them over pooled broker connections grouped per gate with the order of the events of each gate preserved.
+    The task ids are returned in the order of the events in the request; events already received
+    are flagged as duplicates and not published again, and repeated statuses of a gate are coalesced,
+    counted in the meta_info of the next published event of the gate.
+    While the queue of a gate is behind, its heartbeats are shed and the response is a 429 or 503 with
+    Retry-After; resending the whole batch is safe, as only the shed events are published again.
+    """
+    if len(events) > EVENT_BATCH_MAX_SIZE:
+        response.status_code = 413
+        return {
+            "status": "rejected",
+            "task_id": "",
+            "data": {"error": f"Batch of {len(events)} events exceeds the maximum of {EVENT_BATCH_MAX_SIZE}"},
+        }
+
+    keys = [idempotency_key(event) for event in events]
+    claimed = await run_in_threadpool(lambda: [received_events.claim(key) for key in keys])
+    admissions = await run_in_threadpool(
+        lambda: {location: admission_control.check(location) for location in {event.location for event in events}}
+    )
+
+    def decide(event, is_claimed):
+        if not is_claimed:
+            return None, None
+        if should_shed(event, admissions[event.location]):
+            return SHED, None
+        return event_coalescer.admit(event.location, event.status, event.timestamp.isoformat())
+
+    decided = await run_in_threadpool(lambda: [decide(event, is_claimed) for event, is_claimed in zip(events, claimed)])
+    decisions = [decision for decision, _ in decided]
+    for event, (_, coalesced) in zip(events, decided):
+        record_coalesced(event, coalesced)
+    shed = [index for index, decision in enumerate(decisions) if decision == SHED]
+    if shed:
+        await run_in_threadpool(lambda: [received_events.release(keys[index]) for index in shed])
+
+    events_per_gate: Dict[str, List] = {}
+    for index, event in enumerate(events):
+        if claimed[index] and decisions[index] not in (COALESCED, SHED):
+            events_per_gate.setdefault(event.location, []).append((index, event))
+
+    ordered = [(index, event) for gate_events in events_per_gate.values() for index, event in gate_events]
+    try:
+        published = await publisher.publish_many(
+            log_delivery.create_delivery,
+            [((encode_event(event),), {}) for _, event in ordered],
+            keys=[event.location for _, event in ordered],
+        )
+    except Exception as err:
+        await run_in_threadpool(lambda: [received_events.release(keys[index]) for index, _ in ordered])
+        await run_in_threadpool(
+            lambda: [event_coalescer.forget(event.location, decided[index][1]) for index, event in ordered]
+        )
+        if not isinstance(err, PublisherBusy):
+            raise
+        response.status_code = 503
+        response.headers["Retry-After"] = PUBLISHER_BUSY_RETRY_AFTER
+        return {"status": "rejected", "task_id": "", "data": {"error": str(err)}}
+
+    task_ids = [None] * len(events)
+    for (index, _), task_id in zip(ordered, published):
+        task_ids[index] = task_id
+
+    result = {
+        "status": "received",
+        "task_id": str(uuid.uuid4()),
+        "data": {
+            "tasks": [
+                {
+                    "event_uid": event.event_uid,
+                    "location": event.location,
+                    "task_id": task_id,
+                    "duplicate": not is_claimed,
+                    "coalesced": decision == COALESCED,
+                    "shed": decision == SHED,
+                }
+                for event, task_id, is_claimed, decision in zip(events, task_ids, claimed, decisions)
+            ]
+        },
+    }
+
+    if shed:
+        response.status_code = shed_status_code([admissions[events[index].location] for index in shed])
+        response.headers["Retry-After"] = ADMISSION_RETRY_AFTER
 
     return result
 
@@ -93,4 +278,118 @@ async def get_task_status(task_id: str):
     if task_result.state == 'FAILURE':
         return {"status": task_result.state, "error": str(task_result.result)}
     
-    return {"status": task_result.state, "result": task_result.result}
\ No newline at end of file
+    return {"status": task_result.state, "result": task_result.result}
+
+
+class RedriveRequest(BaseModel):
+    """
+    Pydantic model selecting the dead letters to re-drive; all pending dead letters by default.
+    """
+    ids: Optional[List[int]] = Field(None, description="Ids of the dead letters to re-drive.")
+    location: Optional[str] = Field(None, description="Only re-drive the dead letters of this gate.")
+    limit: int = Field(100, gt=0, le=10000, description="Maximum number of dead letters to re-drive.")
+    rate: float = Field(10, gt=0, description="Maximum number of tasks re-driven per second.")
+
+
+def pending_dead_letters(location=None, ids=None):
+    dead_letters = DeadLetter.objects.filter(status='pending')
+    if location:
+        dead_letters = dead_letters.filter(location=location)
+    if ids:
+        dead_letters = dead_letters.filter(id__in=ids)
+    return dead_letters.order_by('event_timestamp', 'created_at', 'id')
+
+
+@router.api_route(
+    "/delivery/dead-letters", methods=["GET"], tags=["DeliveryAPI"]
+    )
+async def get_dead_letters(location: Optional[str] = None, limit: int = 100):
+    """
+    Endpoint to list the pending delivery tasks that exhausted their retries, oldest event first.
+    """
+    def load():
+        return [
+            {
+                "id": dead_letter.id,
+                "task_id": dead_letter.task_id,
+                "task_name": dead_letter.task_name,
+                "location": dead_letter.location,
+                "event_timestamp": dead_letter.event_timestamp,
+                "retries": dead_letter.retries,
+                "error": dead_letter.error,
+                "payload": dead_letter.payload,
+                "updated_at": dead_letter.updated_at,
+            }
+            for dead_letter in pending_dead_letters(location=location)[:limit]
+        ]
+
+    dead_letters = await run_in_threadpool(load)
+    return {"status": "ok", "task_id": "", "data": {"dead_letters": dead_letters}}
+
+@router.api_route(
+    "/delivery/dead-letters/redrive", methods=["POST"], tags=["DeliveryAPI"]
+    )
+async def redrive_dead_letters(request: RedriveRequest, background_tasks: BackgroundTasks):
+    """
+    Endpoint to re-drive pending dead letters in bulk, in per-gate event order at `rate` tasks per second.
+    The re-drive runs after the response; the selected dead letters are returned.
+    """
+    def select():
+        return list(pending_dead_letters(location=request.location, ids=request.ids).values_list('id', flat=True)[:request.limit])
+
+    selected = await run_in_threadpool(select)
+    if selected:
+        background_tasks.add_task(redrive, DeadLetter.objects.filter(id__in=selected), rate=request.rate)
+
+    return {"status": "accepted", "task_id": "", "data": {"dead_letters": selected}}
+
+@router.api_route(
+    "/metrics/breakers", methods=["GET"], tags=["DeliveryAPI"], response_class=PlainTextResponse
+    )
+async def get_breaker_metrics():
+    """
+    Endpoint exposing the state of the MediaManager circuit breakers in the Prometheus text format,
+    as 0 (closed), 1 (half-open) or 2 (open), along with their consecutive failures.
+    """
+    breakers = await run_in_threadpool(log_delivery.media_breakers.states)
+    
+    lines = [
+        "# HELP delivery_manager_circuit_breaker_state State of the circuit breaker: 0 closed, 1 half-open, 2 open.",
+        "# TYPE delivery_manager_circuit_breaker_state gauge",
+    ]
+    lines += [
+        f'delivery_manager_circuit_breaker_state{{target="{breaker["name"]}"}} {STATE_VALUES[breaker["state"]]}'
+        for breaker in breakers
+    ]
+    lines += [
+        "# HELP delivery_manager_circuit_breaker_failures Consecutive failures seen by the circuit breaker.",
+        "# TYPE delivery_manager_circuit_breaker_failures gauge",
+    ]
+    lines += [
+        f'delivery_manager_circuit_breaker_failures{{target="{breaker["name"]}"}} {breaker["failures"]}'
+        for breaker in breakers
+    ]
+    
+    return "\n".join(lines) + "\n"
+
+
+@router.api_route(
+    "/metrics/queues", methods=["GET"], tags=["DeliveryAPI"], response_class=PlainTextResponse
+    )
+async def get_queue_metrics():
+    """
+    Endpoint exposing the depth, consumers and lag of the delivery partition queues in the Prometheus text format,
+    as seen by the admission control of the events API.
+    """
+    queues = await run_in_threadpool(admission_control.queues)
+    
+    lines = []
+    for metric, key, description in (
+        ("delivery_manager_queue_depth", "depth", "Messages waiting in the delivery queue."),
+        ("delivery_manager_queue_consumers", "consumers", "Consumers of the delivery queue."),
+        ("delivery_manager_queue_lag_seconds", "lag", "Age of the last event applied from the delivery queue, growing while messages wait."),
+    ):
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{queue="{name}"}} {stats[key]}' for name, stats in sorted(queues.items())]
+    
+    return "\n".join(lines) + "\n"
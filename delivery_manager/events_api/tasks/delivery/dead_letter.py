@@ -0,0 +1,120 @@
+import os
+import time
+import celery
+import django
+import logging
+django.setup()
+from celery import shared_task
+from django.db.models import F
+from django.utils import timezone
+from database.models import DeadLetter
+from events_api.config.celery_utils import create_celery
+from events_api.tasks.delivery.wire import encode_event, decode_event, event_location
+
+# About 8 hours of retries at the maximum backoff, after which the dead letter is only left in the logs.
+DEAD_LETTER_MAX_RETRIES = int(os.getenv('DEAD_LETTER_MAX_RETRIES', 48))
+
+
+def record_dead_letter(task_name, task_id, payload, error, retries=0):
+    """
+    Persist a task that exhausted its retries, with its payload and error, so it can be re-driven later.
+    A task that fails again after a re-drive is put back to pending. A payload that cannot be decoded,
+    which may be why the task failed, is recorded as is, without its event timestamp.
+    """
+    location, event_timestamp = None, None
+    if 'l' in payload:
+        location = event_location(payload)
+        try:
+            event_timestamp = decode_event(payload).timestamp
+        except Exception as err:
+            logging.error(f"Error decoding the dead letter of task {task_name}[{task_id}]: {err}, payload: {payload}")
+    elif 'params' in payload:
+        location = payload['params'].get('gate_id')
+
+    DeadLetter.objects.update_or_create(
+        task_id=task_id,
+        defaults={
+            'task_name': task_name,
+            'location': location,
+            'event_timestamp': event_timestamp,
+            'payload': payload,
+            'error': str(error),
+            'retries': retries,
+            'status': 'pending',
+        },
+    )
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_backoff_max=600, retry_kwargs={"max_retries": DEAD_LETTER_MAX_RETRIES},
+             name='delivery_dead:persist_dead_letter')
+def persist_dead_letter(self, task_name, task_id, payload, error, retries=0):
+    """
+    Persist a dead letter from the delivery_dead queue, retrying up to DEAD_LETTER_MAX_RETRIES times while the database is unavailable.
+    """
+    try:
+        record_dead_letter(task_name, task_id, payload, error, retries=retries)
+    except Exception as err:
+        if self.request.retries >= self.max_retries:
+            logging.error(f"Error persisting the dead letter of task {task_name}[{task_id}], giving up: {err}, payload: {payload}, error: {error}")
+        raise
+    return {"action": "done", "task_id": self.request.id, "result": f"Dead letter of task {task_name}[{task_id}] recorded"}
+
+
+def dead_letter(task_name, task_id, payload, error, retries=0):
+    """
+    Route a task that exhausted its retries to the delivery_dead queue, where it is persisted as a DeadLetter.
+
+    The broker keeps the dead letter while the database is unavailable, which is when most tasks give up.
+    """
+    try:
+        if not isinstance(payload, dict):
+            payload = encode_event(payload)
+        persist_dead_letter.apply_async(args=(task_name, task_id, payload, str(error), retries))
+    except Exception as err:
+        logging.error(f"Error routing task {task_name}[{task_id}] to the dead letters: {err}, payload: {payload}")
+
+
+class DeadLetterTask(celery.Task):
+    """
+    Base class of the delivery tasks: once a task gives up, its payload and error are routed to the dead letters.
+    """
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if args:
+            dead_letter(self.name, task_id, args[0], exc, retries=self.request.retries)
+
+
+def redrive(dead_letters, rate=None, stdout=None):
+    """
+    Publish pending dead letters again under their original task id, oldest event first.
+
+    Events are sent in event timestamp order, so the events of each gate are re-driven in the order they
+    happened, flagged so the workers apply them even if later events of the gate were applied meanwhile.
+
+    :param dead_letters: A queryset of DeadLetter
+    :param rate: The maximum number of tasks published per second, None for no limit
+    :param stdout: A callable reporting progress, e.g. the write method of a command output
+    :return: The number of tasks re-driven
+    """
+    app = create_celery()
+    redriven = 0
+    queryset = dead_letters.filter(status='pending').order_by(F('event_timestamp').asc(nulls_last=True), 'created_at', 'id')
+    for dead_letter in queryset.iterator():
+        DeadLetter.objects.filter(pk=dead_letter.pk).update(status='redriven', redriven_at=timezone.now())
+        try:
+            app.send_task(
+                dead_letter.task_name,
+                args=(dead_letter.payload,),
+                kwargs={'redrive': True},
+                task_id=dead_letter.task_id,
+            )
+        except Exception:
+            DeadLetter.objects.filter(pk=dead_letter.pk).update(status='pending')
+            raise
+        redriven += 1
+
+        if stdout:
+            stdout(f"Re-drove {dead_letter}")
+        if rate:
+            time.sleep(1 / rate)
+
+    return redriven
@@ -2,41 +2,297 @@ import os
 import uuid
 import time
 import celery
+import logging
+import threading
 import django
 from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
 from datetime import datetime, timezone
 django.setup()
-from utils.state import StateMachine
-from utils.time.time_tracker import KeepTrackOfTime
-from utils.media import request_video, request_image
-from utils.api.base import BaseAPI
-from database.models import PlantInfo, PlantEntity, Camera, DeliveryEvent, DeliveryState
+from django.db import connection, transaction, close_old_connections
+from utils.state import StateMachineRegistry
+from utils.media import request_image
+from utils.media.snapshot_scheduler import SnapshotScheduler, SnapshotSlots
+from utils.sqlite_store import store_path
+from utils.api.dispatcher import target
+from utils.db.bulk_writer import BulkWriter
+from utils.reorder import ReorderBuffer
+from database.models import PlantInfo, PlantEntity, Camera, DeliveryEvent, DeliveryState, SyncOutbox
+from database.topology import topology_cache
+from database.delivery_queries import last_deliveries, on_going_deliveries
+from events_api.config.celery_config import DELIVERY_PARTITIONS, delivery_partition, consumed_partitions
+from events_api.tasks.delivery.wire import decode_event
+from events_api.admission import consumer_lag, delivery_queue
+from events_api.tasks.delivery.dead_letter import DeadLetterTask, dead_letter
+from events_api.tasks.delivery.side_effects import (
+    run_side_effects, side_effects_job, hold_stop, completed_side_effects, media_dispatcher, media_breakers,
+    MediaManager_API, MEDIA_MANAGER_TIMEOUT, EXTERNAL_TOPICS, EXTERNAL_MEDIA_MANAGER_API_ROUTE,
+)
+from database.delivery_cache import delivery_cache, MISSING
 
-fsm = StateMachine()
+state_machines = StateMachineRegistry()
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 topics = os.getenv('topics', "/top/rgb_left")
-MediaManager_API = os.getenv('MEDIA_MANAGER_API', "MediaManager_core")
 
-EXTERNAL_TOPICS = os.getenv('EXTERNAL_TOPICS')
-EXTERNAL_MEDIA_MANAGER_API_ROUTE = os.getenv('EXTERNAL_MEDIA_MANAGER_API_ROUTE')
+store_image = os.getenv('STORE_IMAGE', False)
 
-base_api = BaseAPI()
-keep_track_of_time = KeepTrackOfTime()
+def snapshot_params(location, event_name, delivery_id, topic):
+    return {
+        'gate_id': location,
+        'event_name': event_name,
+        "event_type": "delivery on-going",
+        "event_id": delivery_id,
+        "topic": topic,
+    }
 
-store_image = os.getenv('STORE_IMAGE', False)
+def capture_snapshot(location, params):
+    dt = datetime.now().strftime(DATETIME_FORMAT)
+    params.update(
+        {
+            'timestamp': dt,
+            "event_description": f'{dt}: delivery on going',
+        }
+    )
+    
+    image_url = f"http://{MediaManager_API}:18042/api/v1/event/image"
+    request_image.send_request(
+        url=image_url,
+        params=params,
+        session=media_dispatcher.session(image_url),
+        timeout=MEDIA_MANAGER_TIMEOUT,
+        breaker=media_breakers.breaker(target(image_url)),
+    )
+
+# The scheduler belongs to one worker process, which only snapshots the gates of the partitions it consumes;
+# the SNAPSHOT_MAX_CONCURRENCY cap is shared by the workers of the host through the snapshot slots.
+snapshot_scheduler = SnapshotScheduler(
+    capture_snapshot,
+    interval=int(os.getenv('IMAGE_RATE', 10)),
+    max_concurrency=int(os.getenv('SNAPSHOT_MAX_CONCURRENCY', 2)),
+    slots=SnapshotSlots(
+        path=os.getenv('SNAPSHOT_SLOTS_STORE_PATH', store_path('snapshot_slots.sqlite3')),
+        max_concurrency=int(os.getenv('SNAPSHOT_MAX_CONCURRENCY', 2)),
+        lease=float(os.getenv('SNAPSHOT_SLOT_LEASE', 60)),
+    ),
+)
+
+# Events are applied per gate in event timestamp order, each held EVENT_LATENESS seconds to let late events overtake it.
+EVENT_LATENESS = float(os.getenv('EVENT_LATENESS', 0))
+MAX_EVENT_ATTEMPTS = 6
+# Extra seconds the events behind a failed event are held, on top of its retry countdown, for the retry to come back.
+EVENT_RETRY_GRACE = float(os.getenv('EVENT_RETRY_GRACE', 5))
+reorder_buffer = ReorderBuffer(lateness=EVENT_LATENESS)
+processing_lock = threading.RLock()
+
+event_writer = BulkWriter(
+    DeliveryEvent,
+    max_size=int(os.getenv('EVENT_FLUSH_SIZE', 100)),
+    max_delay=float(os.getenv('EVENT_FLUSH_INTERVAL', 5)),
+    ignore_conflicts=True,
+)
+
+def worker_partitions():
+    """
+    Return the delivery partitions consumed by this celery worker, all of them if it was not started with -Q.
+    """
+    consume_from = celery.current_app.amqp.queues.consume_from
+    if not consume_from:
+        return set(range(DELIVERY_PARTITIONS))
+    return consumed_partitions(consume_from)
+
+@worker_process_init.connect
+def rehydrate_state_machines(partitions=None, **kwargs):
+    """
+    Rebuild the per-gate state machines and the last-delivery cache from the last DeliveryState
+    of every gate, so that a worker restart does not lose the Truck/NoTruck state of the gates.
+
+    Snapshots are resumed only for the on-going deliveries of the gates of `partitions`, the ones
+    this worker consumes: the other gates are snapshotted by the workers of their own partition.
+
+    :param partitions: The delivery partitions consumed by the worker, taken from its queues by default
+    """
+    connection.close()
+    delivery_statuses = delivery_cache.load()
+    state_machines.rehydrate(delivery_statuses)
+    print(f"Rehydrated state machines for {len(state_machines)} gates")
+    
+    if store_image:
+        partitions = worker_partitions() if partitions is None else partitions
+        for delivery in on_going_deliveries():
+            if delivery_partition(delivery.delivery_location) not in partitions:
+                continue
+            topology = topology_cache.get(delivery.delivery_location)
+            if delivery_statuses.get(delivery.delivery_location) == 'on-going' and topology and topology.topics:
+                snapshot_scheduler.start_delivery(
+                    delivery.delivery_location,
+                    snapshot_params(delivery.delivery_location, 'delivery', delivery.delivery_id, topology.topics[0]),
+                )
+    
+    threading.Thread(target=run_reorder_flusher, name="ReorderFlusher", daemon=True).start()
+
+@worker_process_shutdown.connect
+def flush_delivery_events(**kwargs):
+    drain_reorder_buffer(flush=True)
+    event_writer.close(timeout=10)
+    print("Flushed delivery events on shutdown")
+
+def event_time(event):
+    """
+    Return the timestamp of an event as an aware UTC datetime; naive timestamps are taken as UTC.
+    """
+    if event.timestamp.tzinfo is None:
+        return event.timestamp.replace(tzinfo=timezone.utc)
+    return event.timestamp.astimezone(timezone.utc)
+
+def sync_payload(delivery_state, tenant_domain, delivery_end):
+    return {
+        'event_id': delivery_state.delivery_id,
+        "source_id": "delivery_manager",
+        "target": "delivery",
+        "data": {
+            "tenant_domain": tenant_domain,
+            "delivery_id": delivery_state.delivery_id,
+            "location": delivery_state.delivery_location,
+            "delivery_start": delivery_state.delivery_start.strftime(DATETIME_FORMAT),
+            "delivery_end": delivery_end.strftime(DATETIME_FORMAT),
+        }
+    }
+
+def next_transition(event, delivery_status):
+    """
+    Run the event through the gate state machine, starting from the status of the last delivery.
+
+    :return: 'start', 'stop' or None
+    """
+    fsm = state_machines.sync(event.location, delivery_status=delivery_status)
+    fsm.on_event(event=event.status)
+    
+    if str(fsm) == 'Truck' and delivery_status == 'done':
+        return 'start'
+    
+    if str(fsm) == 'NoTruck' and delivery_status == 'on-going':
+        return 'stop'
+    
+    return None
+
+def apply_transition(event, topology):
+    """
+    Read the last delivery of the gate, run the event through the gate state machine and persist
+    the resulting transition as one transaction.
+
+    The edge-cloud-sync notification of a transition is written to the SyncOutbox in the same
+    transaction, and shipped later by the `drain_sync_outbox` command.
+
+    The PlantEntity row of the gate is locked (SELECT ... FOR UPDATE) for the duration of the
+    transaction, so concurrent workers on any host serialize per gate instead of racing on the
+    read-modify-write, while different gates proceed in parallel.
+
+    Events that do not move a gate whose last delivery is cached are answered from the cache
+    without touching the database. Transitions always re-read the gate under the lock.
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 5},
-             name='delivery:create_delivery')
-def create_delivery(self, event, **kwargs):
+    :param event: The delivery event to apply
+    :param topology: The GateTopology of the gate where the event occurred
+    :return: A tuple of (delivery_state, transition, delivery_status) where delivery_state is the current
+        delivery of the gate, transition is 'start', 'stop' or None and delivery_status is the status of
+        the gate before the event
+    """
+    cached_delivery = delivery_cache.get(topology.entity_id)
+    if cached_delivery is not MISSING:
+        delivery_status = cached_delivery.delivery_status if cached_delivery else 'done'
+        if next_transition(event, delivery_status) is None:
+            return cached_delivery, None, delivery_status
+    
+    try:
+        with transaction.atomic():
+            PlantEntity.objects.select_for_update().get(pk=topology.entity_id)
+            last_delivery = last_deliveries(topology.entity_id).first()
+            delivery_cache.set(topology.entity_id, last_delivery)
+            delivery_status = last_delivery.delivery_status if last_delivery else 'done'
+            
+            transition = next_transition(event, delivery_status)
+            
+            if transition == 'start':
+                delivery_state = DeliveryState()
+                delivery_state.delivery_start = event_time(event)
+                delivery_state.delivery_id = event.event_uid
+                delivery_state.entity_id = topology.entity_id
+                delivery_state.delivery_status = 'on-going'
+                delivery_state.delivery_location = event.location
+                delivery_state.meta_info = event.meta_info
+                delivery_state.save()
+                SyncOutbox.objects.create(
+                    event_id=delivery_state.delivery_id,
+                    payload=sync_payload(delivery_state, topology.tenant_domain, delivery_end=event_time(event)),
+                )
+            
+            elif transition == 'stop':
+                delivery_state = last_delivery
+                delivery_state.delivery_end = max(event_time(event), delivery_state.delivery_start)
+                delivery_state.delivery_status = 'done'
+                delivery_state.save()
+                SyncOutbox.objects.create(
+                    event_id=delivery_state.delivery_id,
+                    payload=sync_payload(delivery_state, topology.tenant_domain, delivery_end=delivery_state.delivery_end),
+                )
+            
+            else:
+                delivery_state = last_delivery
+            
+            transaction.on_commit(lambda: delivery_cache.set(topology.entity_id, delivery_state))
+    
+    except Exception:
+        delivery_cache.invalidate(topology.entity_id)
+        raise
+    
+    return delivery_state, transition, delivery_status
+
+def completed_transition(task_id, transition, delivery_state, retries=0):
+    """
+    Remember the transition committed by a task, or resume it on a retry of a task whose transition was committed.
+
+    The side effects store is best effort: when it cannot be used, the event is still applied and the side
+    effects of its transition emitted, only a later retry of the task can no longer resume them.
+
+    :return: A tuple of (transition, delivery_state)
+    """
+    transition_key = f"{task_id}:transition"
+    recorded = None
+    try:
+        if transition is not None:
+            completed_side_effects.claim(transition_key, f"{transition}:{delivery_state.pk}")
+        elif retries:
+            recorded = completed_side_effects.get(transition_key)
+    except Exception as err:
+        logging.error(f"Error using the completed transition of task {task_id}: {err}")
+
+    if recorded is not None:
+        transition, delivery_pk = recorded.split(':')
+        delivery_state = DeliveryState.objects.get(pk=delivery_pk)
+
+    return transition, delivery_state
+
+def handle_event(event, task_id, retries=0):
+    """
+    Apply one delivery event: record it, move the gate and emit the side effects of the transition
+    as a `run_side_effects` job on the delivery_io queue.
+
+    The event is recorded under the task id, so the autoretries, reorder requeues and re-drives of a
+    task do not record it again.
+
+    :param event: The decoded delivery event
+    :param task_id: The id of the task that received the event, used to key its completed side effects
+    :param retries: The number of previous attempts at this event
+    :return: The result of the event
+    """
     data: dict = {}
     
     try:
-        if not PlantEntity.objects.filter(entity_uid=event.location).exists():
-            self.request.state = "FAILURE"
+        topology = topology_cache.get(event.location)
+        if topology is None:
             data.update(
                 {
                     "action": "failed",
-                    "task_id": self.request.id,
+                    "task_id": task_id,
                     "time": datetime.now().strftime(DATETIME_FORMAT),
                     "result": f"Invalid event location ID {event.location} provided. Delivery event could not be saved.",
                 }
@@ -44,16 +300,27 @@ def create_delivery(self, event, **kwargs):
             
             return data
         
-        plant_entity = PlantEntity.objects.get(entity_uid=event.location)
-        tenant_domain = plant_entity.entity_type.plant.domain
-        topics = list(plant_entity.cameras.values_list('stream_topic', flat=True))
-        last_delivery = DeliveryState.objects.filter(entity=plant_entity).order_by('-created_at').first()
+        event_writer.add(
+            DeliveryEvent(
+                event_id=event.event_uid,
+                event_name=event.event_name,
+                event_location_id=topology.entity_id,
+                event_timestamp=event.timestamp,
+                status=event.status,
+                description=event.description,
+                meta_info=event.meta_info,
+                task_id=task_id,
+            )
+        )
         
-        fsm.on_event(event=event.status)
-        dt = datetime.now().strftime(DATETIME_FORMAT)
+        topics = topology.topics
+        delivery_state, transition, delivery_status = apply_transition(event=event, topology=topology)
+        consumer_lag.record(delivery_queue(event.location), (datetime.now(timezone.utc) - event_time(event)).total_seconds())
         
-        delivery_status = last_delivery.delivery_status if last_delivery else 'done'
-        delivery_id = last_delivery.delivery_id if last_delivery else event.event_uid
+        # A retry of a task whose transition was committed sees no transition anymore:
+        # resume the side effects of the recorded transition instead.
+        transition, delivery_state = completed_transition(task_id, transition, delivery_state, retries)
+        dt = datetime.now().strftime(DATETIME_FORMAT)
         
         msg = f'{dt}: No delivery at the moment'
         if delivery_status == 'on-going':
@@ -78,151 +345,53 @@ def create_delivery(self, event, **kwargs):
                 'topics': EXTERNAL_TOPICS,
             }
         
-        if str(fsm) == 'Truck' and delivery_status == 'done':
-            delivery_start = datetime.now(tz=timezone.utc)
-            delivery_state = DeliveryState()
-            delivery_state.delivery_start = delivery_start
-            delivery_state.delivery_id = event.event_uid
-            delivery_state.entity = plant_entity
-            delivery_state.delivery_status = 'on-going'
-            delivery_state.delivery_location = event.location
-            delivery_state.meta_info = event.meta_info
-            delivery_state.save()
-            msg = f"delivery start at {delivery_start}"
+        if transition in ('start', 'stop'):
+            if transition == 'start':
+                msg = f"delivery start at {delivery_state.delivery_start}"
+            else:
+                msg = f"delivery end at {delivery_state.delivery_end}"
             
             params.update(
                 {
-                    "event_type": "start",
+                    "event_type": transition,
                     "event_description": msg,
                     "event_id": delivery_state.delivery_id,
                 }
             )
-
             
-            request_video.send_request(
-                url=f"http://{MediaManager_API}:18042/api/v1/event/rt_video/start",
-                params=params,
-            )      
-
+            external_params = None
             if EXTERNAL_TOPICS and EXTERNAL_MEDIA_MANAGER_API_ROUTE:
                 b_params.update(
                     {
-                        "event_type": "start",
+                        "event_type": transition,
                         "event_description": msg,
                         "event_id": delivery_state.delivery_id,
                     }
                 )
-
-                request_video.send_request(
-                    url=f"{EXTERNAL_MEDIA_MANAGER_API_ROUTE}/api/v1/event/rt_video/start",
-                    params=b_params,
-                )
-
-
-            base_api.post(
-                url=f"http://{os.getenv('EDGE_CLOUD_SYNC_HOST', '0.0.0.0')}:{os.getenv('EDGE_CLOUD_SYNC_PORT', '27092')}/api/v1/data",
-                payload={
-                    'event_id': delivery_state.delivery_id,
-                    "source_id": "delivery_manager",
-                    "target": "delivery",
-                    "data": {
-                        "tenant_domain": tenant_domain,
-                        "delivery_id": delivery_state.delivery_id,
-                        "location": delivery_state.delivery_location,
-                        "delivery_start": delivery_state.delivery_start.strftime(DATETIME_FORMAT),
-                        "delivery_end": datetime.now(tz=timezone.utc).strftime(DATETIME_FORMAT),
-                    }
-                }
-            )
-                
-        if str(fsm)=='NoTruck':
-            delivery_end = datetime.now(tz=timezone.utc)
-            delivery_state = last_delivery
+                external_params = b_params
             
-            if delivery_status == 'on-going':
-                delivery_state.delivery_end = delivery_end
-                delivery_state.delivery_status = 'done'                
-                delivery_state.save()
-                msg = f"delivery end at {delivery_end}"
-                
-                params.update(
-                    {
-                        "event_type": "stop",
-                        "event_description": msg,
-                        "event_id": delivery_state.delivery_id,
-                    }
-                )
-                
-                request_video.send_request(
-                    url=f"http://{MediaManager_API}:18042/api/v1/event/rt_video/stop",
-                    params=params,
-                ) 
-        
-                if EXTERNAL_TOPICS and EXTERNAL_MEDIA_MANAGER_API_ROUTE:
-                    b_params.update(
-                        {
-                            "event_type": "stop",
-                            "event_description": msg,
-                            "event_id": delivery_state.delivery_id,
-                        }
-                    )
-
-                    request_video.send_request(
-                        url=f"{EXTERNAL_MEDIA_MANAGER_API_ROUTE}/api/v1/event/rt_video/stop",
-                        params=b_params,
-                    )
-        
-                base_api.post(
-                    url=f"http://{os.getenv('EDGE_CLOUD_SYNC_HOST', '0.0.0.0')}:{os.getenv('EDGE_CLOUD_SYNC_PORT', '27092')}/api/v1/data",
-                    payload={
-                        'event_id': delivery_state.delivery_id,
-                        "source_id": "delivery_manager",
-                        "target": "delivery",
-                        "data": {
-                            "tenant_domain": tenant_domain,
-                            "delivery_id": delivery_state.delivery_id,
-                            "location": delivery_state.delivery_location,
-                            "delivery_start": delivery_state.delivery_start.strftime(DATETIME_FORMAT),
-                            "delivery_end": delivery_state.delivery_end.strftime(DATETIME_FORMAT),
-                        }
-                    }
-                )
-        
-        
-        print('Time Diff: ',keep_track_of_time.check_if_time_more_than_diff(
-            start=keep_track_of_time.what_is_the_time, 
-            end=time.time(), 
-            diff=int(os.getenv('IMAGE_RATE', 10))
-            ) and delivery_status == 'on-going')
+            if transition == 'start':
+                hold_stop(delivery_state.delivery_id)
+            run_side_effects.apply_async(
+                args=(side_effects_job(task_id, transition, params, external_params, delivery_id=delivery_state.delivery_id),)
+            )
         
         
-        if delivery_status == 'on-going' and keep_track_of_time.check_if_time_more_than_diff(
-            start=keep_track_of_time.what_is_the_time, 
-            end=time.time(), 
-            diff=int(os.getenv('IMAGE_RATE', 10))
+        if store_image and topics:
+            if transition == 'stop':
+                snapshot_scheduler.stop_delivery(event.location)
+            elif delivery_state is not None and delivery_state.delivery_status == 'on-going' and (
+                transition == 'start' or not snapshot_scheduler.is_scheduled(event.location)
             ):
-            params = {
-                'gate_id': event.location,
-                'event_name': event.event_name,
-                'timestamp': dt,
-                "event_type": "delivery on-going",
-                "event_description": msg,
-                "event_id": delivery_id,
-                "topic": topics[0]
-                }
-            
-            if store_image:
-                request_image.send_request(
-                    url=f"http://{MediaManager_API}:18042/api/v1/event/image",
-                    params=params
+                snapshot_scheduler.start_delivery(
+                    event.location,
+                    snapshot_params(event.location, event.event_name, delivery_state.delivery_id, topics[0]),
                 )
-            
-            keep_track_of_time.update_time()
         
         data.update(
             {
                 "action": "done",
-                "task_id": self.request.id,
+                "task_id": task_id,
                 "time": datetime.now().strftime("%Y-%m-%d %H-%M-%S"),
                 "result": msg
             }
@@ -234,6 +403,118 @@ def create_delivery(self, event, **kwargs):
 
     return data
 
+def apply_ready_events(location, flush=False, task_id=None):
+    """
+    Apply the buffered events of a gate whose lateness window is over, in timestamp order.
+
+    When the event of the task `task_id`, the task draining the buffer, fails, the error is raised
+    so the task retries it through the broker, and the events after it are held 2 ** attempts + EVENT_RETRY_GRACE
+    seconds for the retry to come back first. An event of another task, whose message was already
+    acknowledged, is put back in the buffer with the events after it instead, and the gate is held
+    2 ** attempts seconds before it is applied again; such an event failing MAX_EVENT_ATTEMPTS times is
+    moved to the dead letters and the gate goes on. The errors of other tasks are never raised, so no
+    retry pushes an event that is still buffered a second time.
+
+    :param task_id: The id of the task draining the buffer, if any
+    :return: A mapping of task id to the result of its event
+    """
+    results = {}
+    with processing_lock:
+        ready = reorder_buffer.pop_ready(location, flush=flush)
+        for index, (timestamp, item) in enumerate(ready):
+            event, event_task_id, attempts = item
+            try:
+                results[event_task_id] = handle_event(event, task_id=event_task_id, retries=attempts)
+            except Exception as err:
+                logging.error(f"Error applying event {event.event_uid} of task {event_task_id} at {location}: {err}")
+                remaining = ready[index + 1:]
+                if event_task_id == task_id:
+                    reorder_buffer.requeue(location, remaining, delay=2 ** attempts + EVENT_RETRY_GRACE)
+                    raise
+                delay = 0.0
+                if attempts + 1 < MAX_EVENT_ATTEMPTS:
+                    remaining = [(timestamp, (event, event_task_id, attempts + 1))] + remaining
+                    delay = 2 ** attempts
+                else:
+                    dead_letter(create_delivery.name, event_task_id, event, err, retries=attempts)
+                reorder_buffer.requeue(location, remaining, delay=delay)
+                break
+            reorder_buffer.applied(location, timestamp)
+
+    return results
+
+def drain_reorder_buffer(flush=False):
+    for location in reorder_buffer.keys():
+        try:
+            apply_ready_events(location, flush=flush)
+        except Exception as err:
+            print(f"Error applying buffered events of {location}: {err}")
+
+def run_reorder_flusher():
+    # Also applies the events put back after a failure, so it runs even without a lateness window.
+    while True:
+        time.sleep(min(EVENT_LATENESS, 1) or 1)
+        # Runs outside of any task, so its connections are not recycled by celery.
+        close_old_connections()
+        drain_reorder_buffer()
+
+# The message of an event is acknowledged once its task returns (acks_late), so an event being applied
+# when the worker dies is delivered again; a failed event goes back to the broker through self.retry.
+# Events still held in the buffer after their task returned (EVENT_LATENESS > 0, or behind a failed
+# event of another task) only live in the worker memory: a clean shutdown applies them, a crash loses them.
+@shared_task(bind=True, base=DeadLetterTask, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 5},
+             acks_late=True, reject_on_worker_lost=True, name='delivery:create_delivery')
+def create_delivery(self, event, redrive=False, **kwargs):
+    data: dict = {}
+    
+    try:
+        event = decode_event(event)
+        # A re-drive runs as a first attempt, but its transition may have been committed before the task gave up:
+        # count it as a retry so the side effects of the recorded transition are emitted again.
+        attempts = max(self.request.retries, 1) if redrive else self.request.retries
+        item = (event, self.request.id, attempts)
+        # Retries and re-drives of an event accepted before are applied even if later events of the gate were applied meanwhile.
+        if not reorder_buffer.push(event.location, event_time(event), item, force=redrive or self.request.retries > 0):
+            error = f"Event {event.event_uid} at {event.location} is older than the last applied event of the gate."
+            dead_letter(self.name, self.request.id, event, error, retries=self.request.retries)
+            data.update(
+                {
+                    "action": "dead-lettered",
+                    "task_id": self.request.id,
+                    "time": datetime.now().strftime(DATETIME_FORMAT),
+                    "result": error,
+                }
+            )
+            
+            return data
+        
+        try:
+            results = apply_ready_events(event.location, task_id=self.request.id)
+        except Exception as err:
+            failed = err
+        else:
+            failed = None
+    
+    except Exception as err:
+        raise ValueError(f"Error occured while creating delivery: {err}")
+    
+    if failed is not None:
+        raise self.retry(exc=failed, countdown=2 ** attempts)
+    
+    if self.request.id in results:
+        return results[self.request.id]
+    
+    data.update(
+        {
+            "action": "buffered",
+            "task_id": self.request.id,
+            "time": datetime.now().strftime(DATETIME_FORMAT),
+            "result": f"Event {event.event_uid} at {event.location} is applied once its lateness window is over and the events before it are applied.",
+        }
+    )
+    
+    return data
+
 
 
         
@@ -0,0 +1,161 @@
+import os
+import logging
+from celery import shared_task
+from datetime import datetime
+from utils.media import request_video
+from utils.api.dispatcher import Dispatcher, target
+from utils.api.breaker import CircuitBreakers
+from utils.idempotency import IdempotencyStore
+from utils.sqlite_store import store_path
+from events_api.tasks.delivery.dead_letter import DeadLetterTask
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+MediaManager_API = os.getenv('MEDIA_MANAGER_API', "MediaManager_core")
+
+EXTERNAL_TOPICS = os.getenv('EXTERNAL_TOPICS')
+EXTERNAL_MEDIA_MANAGER_API_ROUTE = os.getenv('EXTERNAL_MEDIA_MANAGER_API_ROUTE')
+
+MEDIA_MANAGER_TIMEOUT = float(os.getenv('MEDIA_MANAGER_TIMEOUT', 5))
+EXTERNAL_MEDIA_MANAGER_TIMEOUT = float(os.getenv('EXTERNAL_MEDIA_MANAGER_TIMEOUT', 10))
+
+# MediaManager calls run in their own bounded pool behind one circuit breaker per target, so an
+# outage of MediaManager only costs the video and snapshot requests, never the delivery state.
+media_dispatcher = Dispatcher(
+    max_workers=int(os.getenv('DISPATCHER_WORKERS', 8)),
+    max_pending=int(os.getenv('MEDIA_MANAGER_MAX_PENDING', 64)),
+)
+
+media_breakers = CircuitBreakers(
+    path=os.getenv('BREAKER_STORE_PATH', store_path('circuit_breakers.sqlite3')),
+    failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', 30)),
+)
+
+# Transitions and side effects completed by a task, so that its autoretries do not repeat them.
+completed_side_effects = IdempotencyStore(
+    path=os.getenv('SIDE_EFFECTS_STORE_PATH', store_path('side_effects.sqlite3')),
+    ttl=float(os.getenv('IDEMPOTENCY_TTL', 3600)),
+    max_entries=int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 100000)),
+)
+
+class StartPending(Exception):
+    """
+    Raised by the stop job of a delivery whose start side effects did not complete yet.
+    """
+
+
+def side_effects_job(task_id, transition, params, external_params=None, delivery_id=None):
+    """
+    Build the arguments of a `run_side_effects` job.
+
+    :param task_id: The id of the create_delivery task of the transition, used to key its completed side effects
+    :param transition: 'start' or 'stop'
+    :param params: The params of the MediaManager video request
+    :param external_params: The params of the external MediaManager video request, if one is configured
+    :param delivery_id: The id of the delivery, used to run its stop after its start
+    """
+    return {
+        "task_id": task_id,
+        "transition": transition,
+        "params": params,
+        "external_params": external_params,
+        "delivery_id": delivery_id,
+    }
+
+def pending_start_key(delivery_id):
+    return f"{delivery_id}:start-pending"
+
+def hold_stop(delivery_id):
+    """
+    Record that the start side effects of a delivery were emitted, so that its stop waits for them.
+    """
+    try:
+        completed_side_effects.claim(pending_start_key(delivery_id))
+    except Exception as err:
+        logging.error(f"Error recording the start of delivery {delivery_id}: {err}")
+
+def start_pending(job):
+    """
+    Tell whether the start side effects of the delivery of a job are still to run; store errors count as not pending.
+    """
+    if not job.get("delivery_id"):
+        return False
+    try:
+        return completed_side_effects.seen(pending_start_key(job["delivery_id"]))
+    except Exception as err:
+        logging.error(f"Error reading the start of delivery {job['delivery_id']}: {err}")
+        return False
+
+def release_stop(job):
+    """
+    Record that the start side effects of the delivery of a job completed, releasing its stop.
+    """
+    if job["transition"] != 'start' or not job.get("delivery_id"):
+        return
+    try:
+        completed_side_effects.release(pending_start_key(job["delivery_id"]))
+    except Exception as err:
+        logging.error(f"Error recording the start of delivery {job['delivery_id']}: {err}")
+
+@shared_task(bind=True, base=DeadLetterTask, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 5},
+             name='delivery_io:run_side_effects')
+def run_side_effects(self, job, **kwargs):
+    """
+    Run the side effects of a delivery transition: start or stop the video recordings.
+
+    Jobs are emitted by create_delivery once the transition is committed and served from the
+    delivery_io queue by a high-concurrency pool, so slow downstream services never hold back
+    the delivery state queues.
+
+    Jobs run in any order, but the stop of a delivery is retried while its start is pending (see
+    `hold_stop`), so a recording is never stopped before it was started. Its last retry stops the
+    recording anyway.
+    """
+    data: dict = {}
+
+    if job["transition"] == 'stop' and self.request.retries < self.max_retries and start_pending(job):
+        raise StartPending(f"Start of delivery {job['delivery_id']} not completed yet")
+
+    try:
+        task_id = job["task_id"]
+        transition = job["transition"]
+
+        video_url = f"http://{MediaManager_API}:18042/api/v1/event/rt_video/{transition}"
+        calls = [
+            (completed_side_effects.once(f"{task_id}:{video_url}", request_video.send_request), {
+                "url": video_url,
+                "params": job["params"],
+                "session": media_dispatcher.session(video_url),
+                "timeout": MEDIA_MANAGER_TIMEOUT,
+                "breaker": media_breakers.breaker(target(video_url)),
+            }),
+        ]
+
+        if job.get("external_params") and EXTERNAL_MEDIA_MANAGER_API_ROUTE:
+            external_video_url = f"{EXTERNAL_MEDIA_MANAGER_API_ROUTE}/api/v1/event/rt_video/{transition}"
+            calls.append(
+                (completed_side_effects.once(f"{task_id}:{external_video_url}", request_video.send_request), {
+                    "url": external_video_url,
+                    "params": job["external_params"],
+                    "session": media_dispatcher.session(external_video_url),
+                    "timeout": EXTERNAL_MEDIA_MANAGER_TIMEOUT,
+                    "breaker": media_breakers.breaker(target(external_video_url)),
+                })
+            )
+
+        media_dispatcher.dispatch(calls)
+        release_stop(job)
+
+        data.update(
+            {
+                "action": "done",
+                "task_id": self.request.id,
+                "time": datetime.now().strftime(DATETIME_FORMAT),
+                "result": f"Side effects of delivery {transition} of task {task_id} done",
+            }
+        )
+
+    except Exception as err:
+        raise ValueError(f"Error occured while running delivery side effects: {err}")
+
+    return data
@@ -0,0 +1,77 @@
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Version 1 of the delivery event wire schema: a flat JSON object with one-letter keys.
+#   v: schema version, u: event_uid, n: event_name, l: location, t: timestamp (ISO 8601),
+#   s: status, d: description (omitted when empty), m: meta_info (omitted when empty)
+WIRE_VERSION = 1
+
+
+@dataclass
+class DeliveryEventMessage:
+    """
+    A delivery event as decoded by the worker from a task message.
+    """
+    event_uid: str
+    event_name: str
+    location: str
+    timestamp: datetime
+    status: str
+    description: Optional[str] = None
+    meta_info: Optional[Dict] = None
+
+
+def encode_event(event) -> dict:
+    """
+    Encode a delivery event (DeliveryEventRequest or DeliveryEventMessage) into the compact wire schema.
+    """
+    payload = {
+        'v': WIRE_VERSION,
+        'u': event.event_uid,
+        'n': event.event_name,
+        'l': event.location,
+        't': event.timestamp.isoformat(),
+        's': event.status,
+    }
+
+    if event.description:
+        payload['d'] = event.description
+    if event.meta_info:
+        payload['m'] = event.meta_info
+
+    return payload
+
+
+def decode_event(payload) -> DeliveryEventMessage:
+    """
+    Decode a task payload into a DeliveryEventMessage.
+
+    Events pickled by earlier versions of the API are returned unchanged, so messages still queued
+    during an upgrade are processed.
+    """
+    if not isinstance(payload, dict):
+        return payload
+
+    version = payload.get('v')
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported delivery event wire version {version}")
+
+    return DeliveryEventMessage(
+        event_uid=payload['u'],
+        event_name=payload['n'],
+        location=payload['l'],
+        timestamp=datetime.fromisoformat(payload['t']),
+        status=payload['s'],
+        description=payload.get('d'),
+        meta_info=payload.get('m'),
+    )
+
+
+def event_location(payload) -> Optional[str]:
+    """
+    Return the gate of an encoded (or legacy pickled) event without decoding it.
+    """
+    if isinstance(payload, dict):
+        return payload.get('l')
+    return getattr(payload, 'location', None)
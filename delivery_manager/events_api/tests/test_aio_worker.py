@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import threading
+from unittest import mock, skipUnless
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from django.test import SimpleTestCase, tag
+from events_api import aio_worker
+from events_api.config.celery_config import DELIVERY_PARTITIONS, delivery_partition
+from events_api.tasks.delivery import log_delivery
+from events_api.tasks.delivery.wire import DeliveryEventMessage, encode_event
+
+GATES = 40
+EVENTS_PER_GATE = 10
+# Database round trips of one event in create_delivery.
+EVENT_LATENCY = 0.005
+
+
+class Message:
+    """
+    Stands in for a kombu message of a create_delivery task.
+    """
+    def __init__(self, task_id, task, content_type='application/json'):
+        self.headers = {'id': task_id, 'task': task, 'retries': 0}
+        self.properties = {}
+        self.content_type = content_type
+        self.rejected = False
+
+    def reject(self):
+        self.rejected = True
+
+
+def delivery_events():
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        DeliveryEventMessage(
+            event_uid=f"{gate}-{index}", event_name='delivery', location=f"gate{gate:02d}",
+            timestamp=start + timedelta(seconds=index), status='Truck' if index % 2 == 0 else 'NoTruck',
+        )
+        for index in range(EVENTS_PER_GATE)
+        for gate in range(GATES)
+    ]
+
+
+class AioWorkerMixin:
+
+    def setUp(self):
+        self.applied = {}
+        self.lock = threading.Lock()
+
+    def handle_event(self, event, task_id, retries=0):
+        time.sleep(EVENT_LATENCY)
+        with self.lock:
+            self.applied.setdefault(event.location, []).append(event.timestamp)
+        return {"action": "done", "task_id": task_id}
+
+    def run_aio(self, events):
+        worker = aio_worker.AioWorker(app=mock.Mock(), queues=[])
+
+        async def serve():
+            worker.loop = asyncio.get_running_loop()
+            worker.loop.set_default_executor(ThreadPoolExecutor(max_workers=aio_worker.AIO_DB_CONCURRENCY))
+            started = time.perf_counter()
+            for task_id, event in enumerate(events):
+                worker.pending += 1
+                worker.dispatch(([encode_event(event)], {}, {}), Message(str(task_id), log_delivery.create_delivery.name))
+
+            while worker.pending:
+                message, done = await asyncio.to_thread(worker.settled.get)
+                self.assertTrue(done)
+                worker.pending -= 1
+            return time.perf_counter() - started
+
+        return asyncio.run(serve())
+
+    def assertAppliedInOrder(self, events_per_gate):
+        self.assertEqual(len(self.applied), GATES)
+        for location, timestamps in self.applied.items():
+            self.assertEqual(timestamps, sorted(timestamps), location)
+            self.assertEqual(len(timestamps), events_per_gate, location)
+
+
+@tag('benchmark')
+@skipUnless(os.getenv('RUN_BENCHMARKS'), "benchmarks only run with RUN_BENCHMARKS=1")
+class AioWorkerBenchmarkTest(AioWorkerMixin, SimpleTestCase):
+    """
+    Benchmark of the asyncio worker against the prefork setup (one process with concurrency 1 per
+    delivery partition), with the database work of an event simulated by EVENT_LATENCY seconds of I/O.
+    """
+
+    def run_prefork(self, events):
+        partitions = {}
+        for task_id, event in enumerate(events):
+            partitions.setdefault(delivery_partition(event.location), []).append((event, str(task_id)))
+
+        def consume(items):
+            for event, task_id in items:
+                self.handle_event(event, task_id=task_id)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=DELIVERY_PARTITIONS) as processes:
+            list(processes.map(consume, partitions.values()))
+        return time.perf_counter() - started
+
+    def test_asyncio_worker_outruns_the_prefork_workers_and_keeps_the_order_of_each_gate(self):
+        events = delivery_events()
+        with mock.patch.object(log_delivery, 'handle_event', self.handle_event):
+            prefork = self.run_prefork(events)
+            self.applied.clear()
+            aio = self.run_aio(events)
+
+        print(
+            f"\n{len(events)} events, {GATES} gates, {EVENT_LATENCY * 1000:.0f} ms per event: "
+            f"prefork x{DELIVERY_PARTITIONS} {len(events) / prefork:.0f} events/s, "
+            f"asyncio {len(events) / aio:.0f} events/s"
+        )
+        self.assertLess(aio, prefork)
+        self.assertAppliedInOrder(EVENTS_PER_GATE)
+
+
+class AioWorkerTest(AioWorkerMixin, SimpleTestCase):
+
+    def test_failed_events_are_retried_before_the_next_events_of_their_gate(self):
+        events = delivery_events()
+        failing = {event.event_uid for event in events[:GATES]}
+
+        def handle_event(event, task_id, retries=0):
+            if event.event_uid in failing:
+                failing.discard(event.event_uid)
+                raise RuntimeError("database unavailable")
+            return self.handle_event(event, task_id, retries)
+
+        with mock.patch.object(log_delivery, 'handle_event', handle_event), \
+                mock.patch.object(aio_worker, 'AIO_RETRY_BACKOFF', 0), \
+                self.assertLogs(level='ERROR'):
+            self.run_aio(events)
+
+        self.assertEqual(failing, set())
+        self.assertAppliedInOrder(EVENTS_PER_GATE)
+
+    def test_events_are_applied_between_connection_cleanups(self):
+        calls = []
+        with mock.patch.object(aio_worker, 'close_old_connections', lambda: calls.append('cleanup')), \
+                mock.patch.object(log_delivery, 'handle_event', lambda event, task_id, retries: calls.append('event')):
+            aio_worker.handle_event(delivery_events()[0], task_id='1', retries=0)
+
+        self.assertEqual(calls, ['cleanup', 'event', 'cleanup'])
+
+    def test_messages_that_cannot_be_decoded_are_rejected(self):
+        worker = aio_worker.AioWorker(app=mock.Mock(), queues=[])
+        message = Message('1', log_delivery.create_delivery.name, content_type='application/x-python-serialize')
+
+        with self.assertLogs(level='ERROR'):
+            worker.on_decode_error(message, ValueError("Refusing to deserialize untrusted content of type pickle"))
+
+        self.assertTrue(message.rejected)
+        self.assertEqual(worker.pending, 0)
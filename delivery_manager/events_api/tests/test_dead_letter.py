@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+from django.test import TestCase
+from database.models import DeadLetter
+from events_api.tasks.delivery.dead_letter import record_dead_letter
+from events_api.tasks.delivery.wire import encode_event, DeliveryEventMessage
+
+
+class RecordDeadLetterTest(TestCase):
+
+    def test_event_is_recorded_with_its_gate_and_timestamp(self):
+        timestamp = datetime(2026, 10, 17, 6, 30, tzinfo=timezone.utc)
+        payload = encode_event(DeliveryEventMessage(
+            event_uid='uid', event_name='delivery', location='gate01', timestamp=timestamp, status='Truck',
+        ))
+
+        record_dead_letter('delivery:create_delivery', 'task', payload, 'error', retries=5)
+
+        dead_letter = DeadLetter.objects.get(task_id='task')
+        self.assertEqual((dead_letter.location, dead_letter.event_timestamp, dead_letter.status), ('gate01', timestamp, 'pending'))
+
+    def test_undecodable_payload_is_recorded_without_timestamp(self):
+        payload = {'v': 2, 'l': 'gate01'}
+
+        with self.assertLogs(level='ERROR'):
+            record_dead_letter('delivery:create_delivery', 'poison', payload, 'error')
+
+        dead_letter = DeadLetter.objects.get(task_id='poison')
+        self.assertEqual((dead_letter.location, dead_letter.event_timestamp, dead_letter.payload), ('gate01', None, payload))
@@ -0,0 +1,205 @@
+import os
+import time
+import random
+import tempfile
+import threading
+from unittest import mock, skipUnless
+from datetime import datetime, timedelta, timezone
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, tag
+from database.models import PlantInfo, EntityType, PlantEntity, DeliveryState, DeliveryDailyCount, SyncOutbox
+from database.topology import GateTopology, TopologyCache
+from database.delivery_cache import DeliveryStateCache
+from utils.reorder import ReorderBuffer
+from utils.idempotency import IdempotencyStore
+from events_api.tasks.delivery import log_delivery, side_effects
+from events_api.tasks.delivery.wire import DeliveryEventMessage, encode_event
+
+WORKERS = 8
+GATES = 16
+CYCLES = 5
+
+
+def create_gates(count):
+    plant = PlantInfo.objects.create(plant_id='plant', plant_name='plant', plant_location='here')
+    entity_type = EntityType.objects.create(plant=plant, entity_type='gate')
+    return [
+        GateTopology(entity_id=gate.id, entity_uid=gate.entity_uid, tenant_domain=None)
+        for gate in (
+            PlantEntity.objects.create(entity_type=entity_type, entity_uid=f"gate{index:02d}", description='gate')
+            for index in range(count)
+        )
+    ]
+
+
+def delivery_event(topology, event_uid, status, timestamp):
+    return DeliveryEventMessage(
+        event_uid=event_uid, event_name='delivery', location=topology.entity_uid, timestamp=timestamp, status=status,
+    )
+
+
+class DeliveryTransitionsTest(TestCase):
+    """
+    The transitions of a gate driven by a sequence of Truck/NoTruck events.
+    """
+
+    def test_a_sequence_of_events_starts_and_stops_one_delivery_at_a_time(self):
+        topology, = create_gates(1)
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        statuses = ['NoTruck', 'Truck', 'Truck', 'NoTruck', 'NoTruck', 'Truck', 'NoTruck']
+
+        with mock.patch.object(log_delivery.delivery_cache, 'enabled', False):
+            transitions = [
+                log_delivery.apply_transition(delivery_event(topology, f"event-{index}", status, start + timedelta(seconds=index)), topology)[1]
+                for index, status in enumerate(statuses)
+            ]
+
+        self.assertEqual(transitions, [None, 'start', None, 'stop', None, 'start', 'stop'])
+        deliveries = list(DeliveryState.objects.order_by('created_at', 'id'))
+        self.assertEqual([delivery.delivery_id for delivery in deliveries], ['event-1', 'event-5'])
+        self.assertEqual([delivery.delivery_status for delivery in deliveries], ['done', 'done'])
+        self.assertEqual(deliveries[0].delivery_end, start + timedelta(seconds=3))
+        self.assertEqual(SyncOutbox.objects.count(), 4)
+
+
+
+class DeliveryStateCacheTest(TestCase):
+    """
+    With the last delivery of its gate cached, an event that does not move the gate needs no query.
+    """
+
+    def test_events_that_do_not_move_a_cached_gate_need_no_query(self):
+        topology, = create_gates(1)
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        cache = DeliveryStateCache(enabled=True)
+
+        with mock.patch.object(log_delivery, 'delivery_cache', cache):
+            cache.load()
+            log_delivery.state_machines.sync(topology.entity_uid, delivery_status='done')
+            with self.captureOnCommitCallbacks(execute=True):
+                log_delivery.apply_transition(delivery_event(topology, 'event-0', 'Truck', start), topology)
+
+            with self.assertNumQueries(0):
+                delivery_state, transition, delivery_status = log_delivery.apply_transition(
+                    delivery_event(topology, 'event-1', 'Truck', start + timedelta(seconds=1)), topology,
+                )
+
+        self.assertEqual((delivery_state.delivery_id, transition, delivery_status), ('event-0', None, 'on-going'))
+
+
+class HandleEventQueriesTest(TestCase):
+    """
+    The queries of an event that does not move its gate: the topology of the gate is loaded once, then
+    only the transaction of the transition is left (the lock of the gate and the read of its last delivery).
+    """
+
+    def test_topology_is_only_queried_on_the_first_event_of_a_gate(self):
+        topology, = create_gates(1)
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        with mock.patch.object(log_delivery, 'topology_cache', TopologyCache(ttl=300)), \
+                mock.patch.object(log_delivery, 'event_writer', mock.Mock()), \
+                mock.patch.object(log_delivery, 'consumer_lag', mock.Mock()), \
+                mock.patch.object(log_delivery, 'run_side_effects', mock.Mock()), \
+                mock.patch.object(log_delivery.delivery_cache, 'enabled', False):
+            # The gate with its plant, then its cameras; SAVEPOINT, lock, last delivery, RELEASE SAVEPOINT.
+            with self.assertNumQueries(6):
+                log_delivery.handle_event(delivery_event(topology, 'event-0', 'NoTruck', start), task_id='task-0')
+
+            with self.assertNumQueries(4):
+                result = log_delivery.handle_event(
+                    delivery_event(topology, 'event-1', 'NoTruck', start + timedelta(seconds=1)), task_id='task-1',
+                )
+
+        self.assertEqual(result['action'], 'done')
+
+
+class RedriveTest(TestCase):
+    """
+    A re-drive of a task whose transition was committed before it gave up emits the side effects of that transition.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = IdempotencyStore(f"{directory.name}/side_effects.sqlite3")
+        self.topology, = create_gates(1)
+        self.run_side_effects = mock.Mock()
+        for patcher in (
+            mock.patch.object(log_delivery, 'completed_side_effects', store),
+            mock.patch.object(side_effects, 'completed_side_effects', store),
+            mock.patch.object(log_delivery, 'run_side_effects', self.run_side_effects),
+            mock.patch.object(log_delivery, 'reorder_buffer', ReorderBuffer(lateness=0)),
+            mock.patch.object(log_delivery, 'event_writer', mock.Mock()),
+            mock.patch.object(log_delivery, 'consumer_lag', mock.Mock()),
+            mock.patch.object(log_delivery.topology_cache, 'get', lambda location: self.topology),
+            mock.patch.object(log_delivery.delivery_cache, 'enabled', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_redrive_emits_the_side_effects_of_the_committed_transition(self):
+        event = delivery_event(self.topology, 'event-1', 'Truck', datetime.now(timezone.utc))
+        self.run_side_effects.apply_async.side_effect = ConnectionError("broker unavailable")
+        with self.assertRaises(ValueError):
+            log_delivery.handle_event(event, task_id='task-1')
+        self.assertEqual(DeliveryState.objects.get().delivery_status, 'on-going')
+
+        self.run_side_effects.reset_mock(side_effect=True)
+        result = log_delivery.create_delivery.apply(args=(encode_event(event),), kwargs={'redrive': True}, task_id='task-1').get()
+
+        self.assertEqual(result['action'], 'done')
+        self.run_side_effects.apply_async.assert_called_once()
+        job, = self.run_side_effects.apply_async.call_args.kwargs['args']
+        self.assertEqual((job['task_id'], job['transition'], job['delivery_id']), ('task-1', 'start', 'event-1'))
+        self.assertEqual(DeliveryState.objects.count(), 1)
+
+@tag('benchmark')
+@skipUnless(os.getenv('RUN_BENCHMARKS'), "benchmarks only run with RUN_BENCHMARKS=1")
+@skipUnless(connection.vendor == 'postgresql', "row locks are only contended on PostgreSQL")
+class DeliveryContentionTest(TransactionTestCase):
+    """
+    Contention benchmark of the gate row locks: WORKERS workers apply the same Truck, then NoTruck,
+    events to each of GATES gates at once, as when several consumers share the events of the gates.
+    Every gate must go through exactly one delivery per cycle, whatever the interleaving.
+    """
+
+    def test_concurrent_workers_never_double_start_or_lose_a_delivery(self):
+        gates = create_gates(GATES)
+        barrier = threading.Barrier(WORKERS)
+        errors = []
+
+        def work(worker):
+            rng = random.Random(worker)
+            try:
+                for cycle in range(CYCLES):
+                    for status in ('Truck', 'NoTruck'):
+                        barrier.wait()
+                        for topology in rng.sample(gates, len(gates)):
+                            event = delivery_event(
+                                topology, f"{topology.entity_uid}-{cycle}-{status}-{worker}", status, datetime.now(timezone.utc)
+                            )
+                            log_delivery.apply_transition(event, topology)
+            except Exception as err:
+                errors.append(err)
+                barrier.abort()
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work, args=(worker,)) for worker in range(WORKERS)]
+        started = time.perf_counter()
+        with mock.patch.object(log_delivery.delivery_cache, 'enabled', False):
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        elapsed = time.perf_counter() - started
+
+        events = WORKERS * GATES * CYCLES * 2
+        print(f"\n{WORKERS} workers x {GATES} gates: {events} events in {elapsed:.2f}s, {events / elapsed:.0f} events/s")
+        self.assertEqual(errors, [])
+        for topology in gates:
+            deliveries = DeliveryState.objects.filter(entity_id=topology.entity_id)
+            self.assertEqual(deliveries.count(), CYCLES, topology.entity_uid)
+            self.assertFalse(deliveries.exclude(delivery_status='done').exists(), topology.entity_uid)
+        self.assertEqual(SyncOutbox.objects.count(), GATES * CYCLES * 2)
+        self.assertEqual(sum(DeliveryDailyCount.objects.values_list('count', flat=True)), GATES * CYCLES)
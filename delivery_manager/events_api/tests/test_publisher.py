@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+from unittest import skipUnless
+from contextlib import contextmanager
+from types import SimpleNamespace
+from django.test import SimpleTestCase, tag
+from events_api.publisher import TaskPublisher
+
+RATE = 1000  # events per second
+DURATION = 2  # seconds
+ROUND_TRIP = 0.0005  # seconds per AMQP publish
+STALL = 0.1  # seconds the broker stalls every STALL_EVERY publishes
+STALL_EVERY = 250
+GATES = 20
+
+
+class SlowBrokerTask:
+    """
+    Stands in for a celery task published to a broker that takes ROUND_TRIP seconds per message and stalls now and then.
+    """
+    def __init__(self):
+        self.app = SimpleNamespace(producer_or_acquire=self.producer_or_acquire)
+        self.published = 0
+
+    @contextmanager
+    def producer_or_acquire(self):
+        yield object()
+
+    def apply_async(self, args, producer=None, **options):
+        self.published += 1
+        time.sleep(STALL if self.published % STALL_EVERY == 0 else ROUND_TRIP)
+        return SimpleNamespace(id=str(self.published))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+@tag('benchmark')
+@skipUnless(os.getenv('RUN_BENCHMARKS'), "benchmarks only run with RUN_BENCHMARKS=1")
+class PublisherLoadTest(SimpleTestCase):
+    """
+    Load test of the event endpoint publish path at RATE events per second against a slow broker:
+    publishing from the event loop, as the endpoint did, against the publisher threads. The event loop
+    lag is the delay of a 1 ms ticker, i.e. how long every other request of the worker is held.
+    """
+
+    async def load(self, publish):
+        latencies, lags = [], []
+        done = asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - started - 0.001)
+
+        async def send(index):
+            await publish(index)
+            # Measured from the time the event was due, so the time spent waiting for a blocked loop counts.
+            latencies.append(time.perf_counter() - started - index / RATE)
+
+        ticking = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        sent, requests = 0, []
+        while sent < RATE * DURATION:
+            due = min(RATE * DURATION, int((time.perf_counter() - started) * RATE) + 1)
+            requests.extend(asyncio.create_task(send(index)) for index in range(sent, due))
+            sent = due
+            await asyncio.sleep(0.001)
+        await asyncio.gather(*requests)
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ticking
+
+        return sent / elapsed, percentile(latencies, 0.99), percentile(lags, 0.99)
+
+    def test_publishing_from_a_thread_keeps_the_event_loop_responsive(self):
+        task = SlowBrokerTask()
+
+        async def blocking(index):
+            task.apply_async(args=(index,))
+
+        rate, blocking_p99, blocking_lag = asyncio.run(self.load(blocking))
+
+        publisher = TaskPublisher(maxsize=RATE, max_batch=100, threads=4)
+
+        async def threaded(index):
+            await publisher.publish(task, args=(index,), key=f"gate{index % GATES}")
+
+        rate, threaded_p99, threaded_lag = asyncio.run(self.load(threaded))
+
+        print(
+            f"\n{rate:.0f} events/s, broker stalls of {STALL * 1000:.0f} ms every {STALL_EVERY} events:"
+            f"\non the event loop: publish p99 {blocking_p99 * 1000:.1f} ms, loop lag p99 {blocking_lag * 1000:.1f} ms"
+            f"\npublisher threads: publish p99 {threaded_p99 * 1000:.1f} ms, loop lag p99 {threaded_lag * 1000:.1f} ms"
+        )
+        self.assertGreaterEqual(rate, 500)
+        self.assertLess(threaded_p99, blocking_p99)
+        self.assertLess(threaded_p99, STALL * 1.5)
+        self.assertLess(threaded_lag, STALL / 2)
+        self.assertGreaterEqual(blocking_lag, STALL / 2)
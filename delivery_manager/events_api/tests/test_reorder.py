@@ -0,0 +1,99 @@
+import random
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from django.test import SimpleTestCase
+from utils.reorder import ReorderBuffer
+from events_api.tasks.delivery import log_delivery
+from events_api.tasks.delivery.wire import DeliveryEventMessage
+
+
+class ApplyReadyEventsTest(SimpleTestCase):
+    """
+    Stress test of the per-gate application of shuffled events by log_delivery, with failing events.
+    """
+
+    def run_shuffled(self, seed, failure_rate):
+        rng = random.Random(seed)
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        events = [
+            DeliveryEventMessage(
+                event_uid=f"{gate}-{index}", event_name='delivery', location=f"gate{gate:02d}",
+                timestamp=start + timedelta(seconds=index), status='Truck' if index % 2 == 0 else 'NoTruck',
+            )
+            for gate in range(4)
+            for index in range(50)
+        ]
+        rng.shuffle(events)
+
+        applied, dead = [], []
+
+        def handle_event(event, task_id, retries=0):
+            if rng.random() < failure_rate:
+                raise RuntimeError(f"failed to apply {event.event_uid}")
+            applied.append(event)
+            return {"action": "done", "task_id": task_id}
+
+        def dead_letter(task_name, task_id, payload, error, retries=0):
+            dead.append(payload)
+
+        buffer = ReorderBuffer(lateness=3600)
+        with mock.patch.object(log_delivery, 'reorder_buffer', buffer), \
+                mock.patch.object(log_delivery, 'handle_event', handle_event), \
+                mock.patch.object(log_delivery, 'dead_letter', dead_letter), \
+                self.assertLogs(level='ERROR'):
+            for task_id, event in enumerate(events):
+                self.assertTrue(buffer.push(event.location, log_delivery.event_time(event), (event, str(task_id), 0)))
+
+            for _ in range(len(events) * log_delivery.MAX_EVENT_ATTEMPTS):
+                if not len(buffer):
+                    break
+                for location in buffer.keys():
+                    log_delivery.apply_ready_events(location, flush=True)
+
+        self.assertEqual(len(buffer), 0)
+        return events, applied, dead
+
+    def test_every_event_is_applied_once_in_timestamp_order_or_dead_lettered(self):
+        for seed in range(20):
+            events, applied, dead = self.run_shuffled(seed, failure_rate=0.2)
+
+            uids = [event.event_uid for event in applied + dead]
+            self.assertEqual(len(uids), len(set(uids)), f"seed {seed}: an event was applied twice")
+            self.assertEqual(set(uids), {event.event_uid for event in events}, f"seed {seed}: an event was lost")
+
+            for location in {event.location for event in events}:
+                timestamps = [event.timestamp for event in applied if event.location == location]
+                self.assertEqual(timestamps, sorted(timestamps), f"seed {seed}: {location} applied out of order")
+
+    def test_events_failing_every_attempt_are_dead_lettered(self):
+        events, applied, dead = self.run_shuffled(seed=0, failure_rate=1)
+
+        self.assertEqual(applied, [])
+        self.assertEqual(len(dead), len(events))
+
+    def test_failed_event_of_the_draining_task_is_raised_and_the_events_after_it_are_held(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        events = [
+            DeliveryEventMessage(event_uid=str(index), event_name='delivery', location='gate00',
+                                 timestamp=start + timedelta(seconds=index), status='Truck')
+            for index in range(3)
+        ]
+
+        def handle_event(event, task_id, retries=0):
+            if task_id == '0':
+                raise RuntimeError("database unavailable")
+            return {"action": "done", "task_id": task_id}
+
+        buffer = ReorderBuffer(lateness=0)
+        with mock.patch.object(log_delivery, 'reorder_buffer', buffer), \
+                mock.patch.object(log_delivery, 'handle_event', handle_event), \
+                self.assertLogs(level='ERROR'):
+            for event in events:
+                buffer.push(event.location, log_delivery.event_time(event), (event, event.event_uid, 0))
+
+            with self.assertRaises(RuntimeError):
+                log_delivery.apply_ready_events('gate00', task_id='0')
+
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.pop_ready('gate00'), [])
+        self.assertEqual([item[1] for _, item in buffer.pop_ready('gate00', flush=True)], ['1', '2'])
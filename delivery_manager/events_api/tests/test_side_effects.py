@@ -0,0 +1,43 @@
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase
+from utils.idempotency import IdempotencyStore
+from events_api.tasks.delivery import side_effects
+
+
+class SideEffectsOrderTest(SimpleTestCase):
+    """
+    The stop of a delivery waits for its start, whatever the order the delivery_io pool runs them in.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = IdempotencyStore(f"{directory.name}/side_effects.sqlite3")
+        self.calls = []
+        dispatcher = mock.Mock()
+        dispatcher.dispatch.side_effect = lambda calls: self.calls.extend(kwargs["params"]["event_type"] for _, kwargs in calls)
+        for patcher in (
+            mock.patch.object(side_effects, 'completed_side_effects', self.store),
+            mock.patch.object(side_effects, 'media_dispatcher', dispatcher),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def job(self, transition, task_id):
+        return side_effects.side_effects_job(task_id, transition, {"event_type": transition}, delivery_id='delivery-1')
+
+    def test_stop_waits_for_the_start_of_its_delivery(self):
+        side_effects.hold_stop('delivery-1')
+
+        with self.assertRaises(side_effects.StartPending):
+            side_effects.run_side_effects(self.job('stop', 'task-2'))
+        self.assertEqual(self.calls, [])
+
+        side_effects.run_side_effects(self.job('start', 'task-1'))
+        side_effects.run_side_effects(self.job('stop', 'task-2'))
+        self.assertEqual(self.calls, ['start', 'stop'])
+
+    def test_stop_of_a_delivery_without_pending_start_runs_at_once(self):
+        side_effects.run_side_effects(self.job('stop', 'task-2'))
+        self.assertEqual(self.calls, ['stop'])
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase
+from events_api.config.celery_config import delivery_partition, consumed_partitions
+from events_api.tasks.delivery import log_delivery
+
+
+class RehydrateSnapshotsTest(SimpleTestCase):
+    """
+    A worker resumes the snapshots of the on-going deliveries of its own partitions only.
+    """
+
+    def test_consumed_partitions(self):
+        self.assertEqual(consumed_partitions(['delivery.0', 'delivery.2', 'delivery_io', 'celery']), {0, 2})
+        self.assertEqual(consumed_partitions(['delivery_dead']), set())
+
+    def test_snapshots_are_resumed_for_the_gates_of_the_worker_partitions(self):
+        gates = [f"gate{index:02d}" for index in range(16)]
+        on_going = [
+            SimpleNamespace(delivery_location=gate, delivery_id=f"delivery-{gate}")
+            for gate in gates
+        ]
+        scheduler = mock.Mock()
+
+        with mock.patch.object(log_delivery, 'store_image', True), \
+                mock.patch.object(log_delivery, 'connection'), \
+                mock.patch.object(log_delivery, 'threading'), \
+                mock.patch.object(log_delivery, 'state_machines'), \
+                mock.patch.object(log_delivery, 'on_going_deliveries', return_value=on_going), \
+                mock.patch.object(log_delivery, 'snapshot_scheduler', scheduler), \
+                mock.patch.object(log_delivery.delivery_cache, 'load', return_value={gate: 'on-going' for gate in gates}), \
+                mock.patch.object(log_delivery.topology_cache, 'get', return_value=SimpleNamespace(topics=['/top/rgb_left'])):
+            log_delivery.rehydrate_state_machines(partitions={1})
+
+        scheduled = [call.args[0] for call in scheduler.start_delivery.call_args_list]
+        self.assertEqual(scheduled, [gate for gate in gates if delivery_partition(gate) == 1])
+        self.assertTrue(scheduled)
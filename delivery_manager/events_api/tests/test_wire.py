@@ -0,0 +1,52 @@
+import os
+import time
+from unittest import skipUnless
+from datetime import datetime, timezone
+from kombu.serialization import dumps, loads
+from django.test import SimpleTestCase, tag
+from events_api.routers.endpoints import DeliveryEventRequest
+from events_api.tasks.delivery.wire import encode_event, decode_event
+
+ROUNDS = 5000
+
+
+def event_request():
+    return DeliveryEventRequest(
+        event_uid='3f0a1c52-6a36-4f2b-9d43-2d8d1b0c7e11', event_name='delivery', location='gate03',
+        timestamp=datetime(2026, 10, 17, 6, 30, 12, 345000, tzinfo=timezone.utc), status='Truck',
+        description='truck detected at the gate', meta_info={'confidence': 0.97, 'camera': 'rgb_left'},
+    )
+
+
+@tag('benchmark')
+@skipUnless(os.getenv('RUN_BENCHMARKS'), "benchmarks only run with RUN_BENCHMARKS=1")
+class WireBenchmarkTest(SimpleTestCase):
+    """
+    Micro-benchmark of the task message of a delivery event: the JSON wire schema v1 against the
+    pickled DeliveryEventRequest it replaced, for the encode and decode cost and the message size.
+    """
+
+    def measure(self, serializer, encode, decode):
+        event = event_request()
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            content_type, encoding, body = dumps(((encode(event),), {}, {}), serializer=serializer)
+        encoded = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            args, _, _ = loads(body, content_type, encoding, accept={content_type})
+            decoded = decode(args[0])
+        return encoded / ROUNDS, (time.perf_counter() - started) / ROUNDS, len(body), decoded
+
+    def test_json_messages_are_smaller_than_pickled_requests_and_decode_to_the_same_event(self):
+        json_encode, json_decode, json_size, event = self.measure('json', encode_event, decode_event)
+        pickle_encode, pickle_decode, pickle_size, request = self.measure('pickle', lambda event: event, lambda event: event)
+
+        print(
+            f"\njson v1: {json_size} bytes, encode {json_encode * 1e6:.1f} us, decode {json_decode * 1e6:.1f} us"
+            f"\npickle:  {pickle_size} bytes, encode {pickle_encode * 1e6:.1f} us, decode {pickle_decode * 1e6:.1f} us"
+        )
+        self.assertLess(json_size, pickle_size)
+        for name in ('event_uid', 'event_name', 'location', 'timestamp', 'status', 'description', 'meta_info'):
+            self.assertEqual(getattr(event, name), getattr(request, name), name)
@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass
+from django.db.models import FilteredRelation, Q
+from utils.cache import TTLCache
+from .models import MetadataColumn
+
+
+@dataclass(frozen=True)
+class LocalizedMetadata:
+    """
+    The columns of a metadata in one language, as served by the metadata endpoint.
+
+    Attributes:
+        - content (dict): The response body, with the columns and the primary key.
+        - etag (str): A strong ETag of the content.
+    """
+    content: dict
+    etag: str
+
+
+class MetadataNotFound(Exception):
+    """
+    Raised when a metadata has no columns, or a column has no localization in the language.
+    """
+
+
+class MetadataCache(TTLCache):
+    """
+    In-process cache of the localized metadata, keyed by (metadata_id, language), with the ETag of each entry.
+
+    The columns of a metadata are read with their localization in one joined query, and the entries are
+    dropped by the save/delete signals of Metadata, MetadataColumn and MetadataLocalization (see
+    metadata.signals). `get` raises MetadataNotFound for an unknown metadata or language.
+    """
+    def load(self, metadata_id, language):
+        columns = list(
+            MetadataColumn.objects.filter(metadata_id=metadata_id)
+            .annotate(localization=FilteredRelation('localizations', condition=Q(localizations__language=language)))
+            .order_by('id')
+            .values('column_name', 'type', 'metadata__primary_key', 'localization__id', 'localization__title', 'localization__description')
+        )
+        if not columns:
+            raise MetadataNotFound(f"Metadata ID {metadata_id} not found")
+
+        if any(column['localization__id'] is None for column in columns):
+            raise MetadataNotFound(f"language {language} not found")
+
+        content = {
+            "columns": [
+                {
+                    column['column_name']: {
+                        "title": column['localization__title'],
+                        "type": column['type'],
+                        "description": column['localization__description'],
+                    }
+                } for column in columns
+            ],
+            "primary_key": columns[0]['metadata__primary_key'],
+        }
+
+        digest = hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        return LocalizedMetadata(content=content, etag=f'"{digest}"')
+
+
+metadata_cache = MetadataCache(ttl=float(os.getenv('METADATA_CACHE_TTL', 300)))
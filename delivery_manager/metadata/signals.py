@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from .models import Metadata, MetadataColumn, MetadataLocalization
+from .cache import metadata_cache
+
+
+@receiver([post_save, post_delete], sender=Metadata)
+@receiver([post_save, post_delete], sender=MetadataColumn)
+@receiver([post_save, post_delete], sender=MetadataLocalization)
+def invalidate_metadata_cache(sender, **kwargs):
+    metadata_cache.invalidate()
@@ -1,3 +1,32 @@
 from django.test import TestCase
+from .models import Metadata, MetadataColumn, MetadataLocalization
+from .cache import MetadataCache, MetadataNotFound
 
-# Create your tests here.
+
+class MetadataCacheTest(TestCase):
+
+    def setUp(self):
+        self.metadata = Metadata.objects.create(primary_key='delivery_id')
+        column = MetadataColumn.objects.create(metadata=self.metadata, column_name='delivery_id', type='str')
+        self.localization = MetadataLocalization.objects.create(
+            metadata_column=column, language='en', title='Delivery', description='The delivery',
+        )
+        self.cache = MetadataCache(ttl=300)
+
+    def test_metadata_is_loaded_once_until_invalidated(self):
+        with self.assertNumQueries(1):
+            first = self.cache.get(self.metadata.id, 'en')
+            self.assertEqual(self.cache.get(self.metadata.id, 'en'), first)
+
+        self.localization.title = 'Anlieferung'
+        self.localization.save()
+        self.cache.invalidate()
+
+        changed = self.cache.get(self.metadata.id, 'en')
+        self.assertEqual(changed.content['columns'][0]['delivery_id']['title'], 'Anlieferung')
+        self.assertNotEqual(changed.etag, first.etag)
+
+    def test_unknown_languages_are_not_cached(self):
+        with self.assertRaises(MetadataNotFound):
+            self.cache.get(self.metadata.id, 'de')
+        self.assertEqual(len(self.cache), 0)
@@ -2,16 +2,20 @@
 import logging
 import requests
 from requests.exceptions import HTTPError
+from typing import Any, Optional
 from dataclasses import dataclass
 
 
 
 @dataclass
 class BaseAPI:
+    session: Optional[Any] = None
+    timeout: Optional[float] = None
+    
     def get(self, url, params):
         results = {}
         try:
-            response = requests.get(url=url, params=params)
+            response = (self.session or requests).get(url=url, params=params, timeout=self.timeout)
             
             if response.status_code != 200:
                 err = response.json().get('error')
@@ -28,14 +32,15 @@ class BaseAPI:
             raise ValueError(f"Exeception Error getting data from {url}: {err}")
             
         
-    def post(self, url, params=None, payload=None):
+    def post(self, url, params=None, payload=None, session=None, timeout=None):
         try:
             
             print(f"Request to {url} ...", end='')
-            response = requests.post(
+            response = (session or self.session or requests).post(
                 url=url,
                 params=params,
                 json=payload,
+                timeout=timeout or self.timeout,
             )
             
             if response.status_code != 200:
@@ -0,0 +1,202 @@
+import time
+import asyncio
+import logging
+from utils.sqlite_store import SQLiteStore
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Numeric value of each state, as exported by the breaker metric.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BreakerOpen(Exception):
+    """
+    Raised instead of calling an endpoint whose circuit breaker is open.
+    """
+
+
+class CircuitBreakers(SQLiteStore):
+    """
+    Circuit breakers guarding downstream endpoints, one per endpoint name.
+
+    A breaker opens after `failure_threshold` consecutive failures; while open, calls are refused at once
+    instead of waiting for a timeout. After `reset_timeout` seconds it turns half-open and lets
+    `half_open_calls` probe calls through: a success closes it again, a failure opens it for another
+    `reset_timeout`. Probes that never report back are replaced after `reset_timeout`.
+
+    The breakers are kept in a local SQLite file, so all worker processes of the host share them:
+    an endpoint found down by one worker is skipped by the others too.
+
+    Attributes:
+        - failure_threshold (int): The number of consecutive failures that opens a breaker.
+        - reset_timeout (float): The number of seconds a breaker stays open before probing.
+        - half_open_calls (int): The number of probe calls allowed at the same time while half-open.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS circuit_breaker ("
+        "name TEXT PRIMARY KEY, state TEXT NOT NULL, failures INTEGER NOT NULL, "
+        "probes INTEGER NOT NULL, changed_at REAL NOT NULL)",
+    ]
+
+    def __init__(self, path, failure_threshold=5, reset_timeout=30, half_open_calls=1):
+        super().__init__(path)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+    def breaker(self, name):
+        return CircuitBreaker(self, name)
+
+    def allow(self, name):
+        """
+        Tell whether a call to an endpoint may go through; an allowed call must be followed by
+        `record_success` or `record_failure`.
+        """
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT state, probes, changed_at FROM circuit_breaker WHERE name = ?", (name,)
+            ).fetchone()
+
+            allowed = True
+            if row is not None and row[0] != CLOSED:
+                state, probes, changed_at = row
+                if now - changed_at >= self.reset_timeout:
+                    state, probes, changed_at = HALF_OPEN, 0, now
+
+                allowed = state == HALF_OPEN and probes < self.half_open_calls
+                if allowed:
+                    probes += 1
+                conn.execute(
+                    "UPDATE circuit_breaker SET state = ?, probes = ?, changed_at = ? WHERE name = ?",
+                    (state, probes, changed_at, name),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return allowed
+
+    def record_success(self, name):
+        self.connection().execute(
+            "UPDATE circuit_breaker SET state = ?, failures = 0, probes = 0, changed_at = ? "
+            "WHERE name = ? AND (state != ? OR failures > 0)",
+            (CLOSED, time.time(), name, CLOSED),
+        )
+
+    def record_failure(self, name):
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT state, failures FROM circuit_breaker WHERE name = ?", (name,)
+            ).fetchone()
+            state, failures = row if row is not None else (CLOSED, 0)
+
+            failures += 1
+            if state == HALF_OPEN or failures >= self.failure_threshold:
+                state = OPEN
+
+            conn.execute(
+                "INSERT OR REPLACE INTO circuit_breaker (name, state, failures, probes, changed_at) VALUES (?, ?, ?, 0, ?)",
+                (name, state, failures, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def states(self):
+        """
+        :return: A list of dicts with the name, state and consecutive failures of every breaker
+        """
+        rows = self.connection().execute(
+            "SELECT name, state, failures FROM circuit_breaker ORDER BY name"
+        ).fetchall()
+        return [{'name': name, 'state': state, 'failures': failures} for name, state, failures in rows]
+
+
+class CircuitBreaker:
+    """
+    The breaker of one endpoint, as handed to the functions calling it.
+
+    A breaker whose store cannot be read lets the calls through, so the breaker never fails a call by itself.
+    """
+    def __init__(self, breakers, name):
+        self.breakers = breakers
+        self.name = name
+
+    def allow(self):
+        try:
+            return self.breakers.allow(self.name)
+        except Exception as err:
+            logging.error(f"Error reading the circuit breaker of {self.name}: {err}")
+            return True
+
+    def record_success(self):
+        try:
+            self.breakers.record_success(self.name)
+        except Exception as err:
+            logging.error(f"Error recording a success of {self.name}: {err}")
+
+    def record_failure(self):
+        try:
+            self.breakers.record_failure(self.name)
+        except Exception as err:
+            logging.error(f"Error recording a failure of {self.name}: {err}")
+
+
+def call_through(breaker, send):
+    """
+    Send a request through the breaker of its endpoint: a request raising an error or answered with
+    a 5xx status counts as a failure of the endpoint, any other answer as a success.
+
+    :param breaker: The CircuitBreaker of the endpoint, None to send the request unguarded
+    :param send: A callable sending the request and returning the response
+    :return: The response
+    :raise BreakerOpen: If the breaker is open, without sending the request
+    """
+    if breaker is not None and not breaker.allow():
+        raise BreakerOpen(f"Circuit breaker of {breaker.name} is open")
+
+    try:
+        response = send()
+    except Exception:
+        if breaker is not None:
+            breaker.record_failure()
+        raise
+
+    if breaker is not None:
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    return response
+
+
+async def call_through_async(breaker, send):
+    """
+    Asyncio flavour of `call_through`, where `send` returns an awaitable; the breakers are read off the loop.
+    """
+    if breaker is not None and not await asyncio.to_thread(breaker.allow):
+        raise BreakerOpen(f"Circuit breaker of {breaker.name} is open")
+
+    try:
+        response = await send()
+    except Exception:
+        if breaker is not None:
+            await asyncio.to_thread(breaker.record_failure)
+        raise
+
+    if breaker is not None:
+        if response.status_code >= 500:
+            await asyncio.to_thread(breaker.record_failure)
+        else:
+            await asyncio.to_thread(breaker.record_success)
+    return response
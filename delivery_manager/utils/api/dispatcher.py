@@ -0,0 +1,110 @@
+import os
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def target(url):
+    """
+    Return the scheme and host serving `url`, e.g. http://MediaManager_core:18042.
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class Dispatcher:
+    """
+    Runs independent downstream HTTP calls concurrently over keep-alive connection pools.
+
+    One `requests.Session` is kept per target (scheme and host), so repeated calls to the same service
+    reuse their connections. The thread pool and the sessions are created lazily per process, since
+    neither threads nor sockets survive a prefork worker fork.
+
+    With `max_pending` set, the dispatcher is a bulkhead: once that many calls are running or queued,
+    further calls are refused at once (their result is None) instead of piling up behind a slow target.
+
+    Attributes:
+        - max_workers (int): The number of calls that can run at the same time.
+        - pool_maxsize (int): The number of keep-alive connections kept per target.
+        - max_pending (int): The number of calls that can be running or queued, None for no limit.
+    """
+    def __init__(self, max_workers=8, pool_maxsize=8, max_pending=None):
+        self.max_workers = max_workers
+        self.pool_maxsize = pool_maxsize
+        self.max_pending = max_pending
+        self.slots = None
+        self.lock = threading.Lock()
+        self.executor = None
+        self.sessions = {}
+        self.pid = None
+
+    def reset_if_forked(self):
+        if self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='dispatcher')
+            self.slots = threading.BoundedSemaphore(self.max_pending) if self.max_pending else None
+            self.sessions = {}
+            self.pid = os.getpid()
+
+    def session(self, url):
+        """
+        Return the pooled session of the target serving `url`.
+        """
+        self.reset_if_forked()
+        key = target(url)
+        with self.lock:
+            if key not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount(f"{urlsplit(url).scheme}://", adapter)
+                self.sessions[key] = session
+            return self.sessions[key]
+
+    def dispatch(self, calls):
+        """
+        Run the calls concurrently and wait for all of them.
+
+        Every call runs to completion even if another one fails; the first error is then raised,
+        so callers keep the error handling they had when the calls ran one after another.
+
+        :param calls: A list of (callable, kwargs) tuples
+        :return: The results of the calls, in the order of `calls`
+        """
+        self.reset_if_forked()
+        futures = []
+        for func, kwargs in calls:
+            if self.slots is not None and not self.slots.acquire(blocking=False):
+                logging.error(f"Dispatcher is full ({self.max_pending} pending calls): call to {kwargs.get('url')} skipped")
+                futures.append(None)
+                continue
+            futures.append(self.executor.submit(self.run_call, func, kwargs))
+
+        results, errors = [], []
+        for future in futures:
+            if future is None:
+                results.append(None)
+                continue
+            try:
+                results.append(future.result())
+            except Exception as err:
+                results.append(None)
+                errors.append(err)
+
+        if errors:
+            raise errors[0]
+
+        return results
+
+    def run_call(self, func, kwargs):
+        try:
+            return func(**kwargs)
+        finally:
+            if self.slots is not None:
+                self.slots.release()
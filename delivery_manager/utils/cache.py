@@ -0,0 +1,41 @@
+import time
+import threading
+
+
+class TTLCache:
+    """
+    Base class of the in-process caches of rarely changing rows, keyed by the arguments of `load`.
+
+    A value is loaded the first time its key is requested and then served from memory. The save/delete
+    signals of the cached models drop every entry with `invalidate`; as changes made in another process,
+    e.g. the admin, only fire signals there, entries also expire after `ttl` seconds. None is not cached.
+
+    Attributes:
+        - ttl (float): The number of seconds an entry is served.
+    """
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, *key):
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+
+        value = self.load(*key)
+        if value is not None:
+            with self.lock:
+                self.entries[key] = (value, time.monotonic())
+
+        return value
+
+    def load(self, *key):
+        raise NotImplementedError
+
+    def invalidate(self):
+        with self.lock:
+            self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
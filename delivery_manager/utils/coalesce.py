@@ -0,0 +1,124 @@
+import time
+from utils.sqlite_store import SQLiteStore
+
+TRANSITION = 'transition'
+HEARTBEAT = 'heartbeat'
+COALESCED = 'coalesced'
+
+
+class EventCoalescer(SQLiteStore):
+    """
+    Collapses runs of same-status events of a gate into one state-relevant event plus a heartbeat.
+
+    The first event of a gate and every event whose status differs from the last forwarded one are
+    transitions and are forwarded at once, so start/stop latency does not change. Events repeating
+    the last forwarded status are dropped, except one heartbeat every `window` seconds. The last
+    forwarded status is kept in a local SQLite file, so all API processes of the host coalesce
+    against the same view of a gate.
+
+    The dropped events of a gate are counted, and the next forwarded event of the gate carries the
+    summary of the run it ends, so the audit trail of the gate still accounts for every event.
+
+    Attributes:
+        - window (float): The number of seconds between two heartbeats of a gate; 0 forwards every event.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS gate_status (location TEXT PRIMARY KEY, status TEXT NOT NULL, forwarded_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS coalesced_run ("
+        "location TEXT PRIMARY KEY, status TEXT NOT NULL, count INTEGER NOT NULL, "
+        "first_timestamp TEXT, last_timestamp TEXT)",
+    ]
+
+    def __init__(self, path, window=30):
+        super().__init__(path)
+        self.window = window
+
+    def admit(self, location, status, timestamp=None):
+        """
+        Decide whether an event of a gate must be forwarded.
+
+        :param timestamp: The timestamp of the event (ISO 8601), kept in the summary of a coalesced run
+        :return: A tuple of (decision, coalesced): the decision is TRANSITION or HEARTBEAT if the event must be
+            forwarded, COALESCED if it can be dropped; coalesced is the summary of the events of the gate
+            dropped since its last forwarded event, to be recorded with a forwarded event, or None
+        """
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT status, forwarded_at FROM gate_status WHERE location = ?", (location,)
+            ).fetchone()
+
+            if row is None or row[0] != status:
+                decision = TRANSITION
+            elif now - row[1] >= self.window:
+                decision = HEARTBEAT
+            else:
+                decision = COALESCED
+
+            coalesced = None
+            if decision == COALESCED:
+                self.add_run(conn, location, {'status': status, 'count': 1, 'first_timestamp': timestamp, 'last_timestamp': timestamp})
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO gate_status (location, status, forwarded_at) VALUES (?, ?, ?)",
+                    (location, status, now),
+                )
+                coalesced = self.take_run(conn, location)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return decision, coalesced
+
+    def add_run(self, conn, location, coalesced):
+        conn.execute(
+            "INSERT INTO coalesced_run (location, status, count, first_timestamp, last_timestamp) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (location) DO UPDATE SET count = count + excluded.count, "
+            "first_timestamp = MIN(COALESCE(first_timestamp, excluded.first_timestamp), COALESCE(excluded.first_timestamp, first_timestamp)), "
+            "last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp), COALESCE(excluded.last_timestamp, last_timestamp))",
+            (location, coalesced['status'], coalesced['count'], coalesced['first_timestamp'], coalesced['last_timestamp']),
+        )
+
+    def take_run(self, conn, location):
+        row = conn.execute(
+            "SELECT status, count, first_timestamp, last_timestamp FROM coalesced_run WHERE location = ?", (location,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM coalesced_run WHERE location = ?", (location,))
+        status, count, first_timestamp, last_timestamp = row
+        return {'status': status, 'count': count, 'first_timestamp': first_timestamp, 'last_timestamp': last_timestamp}
+
+    def peek(self, location, status):
+        """
+        Tell what `admit` would decide for an event, without recording anything.
+        """
+        row = self.connection().execute(
+            "SELECT status, forwarded_at FROM gate_status WHERE location = ?", (location,)
+        ).fetchone()
+
+        if row is None or row[0] != status:
+            return TRANSITION
+        if time.time() - row[1] >= self.window:
+            return HEARTBEAT
+        return COALESCED
+
+    def forget(self, location, coalesced=None):
+        """
+        Drop the last forwarded status of a gate, e.g. when forwarding its event failed, so the next event goes through.
+
+        :param coalesced: The summary returned with the event that failed, counted back for the next forwarded event
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM gate_status WHERE location = ?", (location,))
+            if coalesced:
+                self.add_run(conn, location, coalesced)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
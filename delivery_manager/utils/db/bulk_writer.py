@@ -0,0 +1,133 @@
+import os
+import logging
+import threading
+from django.db import connection, DataError, IntegrityError
+
+
+class BulkWriter:
+    """
+    Buffers model instances in memory and persists them with `bulk_create` from a background thread.
+
+    The buffer is flushed when it holds `max_size` rows or when `max_delay` seconds have passed since
+    the last flush, whichever comes first. Callers only append to a list, so no INSERT round-trip is
+    added to their hot path. `close` flushes what is left and must be called on shutdown.
+
+    Rows are kept for the next flush while the database is unavailable. A batch rejected for its
+    content, e.g. a foreign key to a deleted row, is written row by row instead and only the rejected
+    rows are dropped, so one bad row never blocks the others.
+
+    Attributes:
+        - model: The Django model class the buffered instances belong to.
+        - max_size (int): The number of buffered rows that triggers a flush.
+        - max_delay (float): The maximum number of seconds a row stays in the buffer.
+        - max_buffer (int): The number of rows kept when the database is unavailable; the oldest rows are dropped beyond it.
+        - ignore_conflicts (bool): Skip rows violating a unique constraint, e.g. rows already written by a previous attempt.
+    """
+    def __init__(self, model, max_size=100, max_delay=5.0, max_buffer=10000, ignore_conflicts=False):
+        self.model = model
+        self.ignore_conflicts = ignore_conflicts
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_buffer = max_buffer
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def add(self, instance):
+        """
+        Queue an unsaved model instance to be persisted with the next flush.
+        """
+        self.ensure_started()
+        with self.lock:
+            self.buffer.append(instance)
+            if len(self.buffer) > self.max_buffer:
+                dropped = len(self.buffer) - self.max_buffer
+                del self.buffer[:dropped]
+                logging.error(f"{self.model.__name__} buffer is full, dropped {dropped} rows")
+            size = len(self.buffer)
+
+        if size >= self.max_size:
+            self.wakeup.set()
+
+    def flush(self):
+        """
+        Persist all buffered instances in one `bulk_create`. Rows are put back in the buffer if the database
+        is unavailable, and written one by one if the batch is rejected for its content.
+
+        :return: The number of rows written
+        """
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+
+        if not rows:
+            return 0
+
+        try:
+            self.model.objects.bulk_create(rows, batch_size=self.max_size, ignore_conflicts=self.ignore_conflicts)
+        except (DataError, IntegrityError) as err:
+            logging.error(f"Error flushing {len(rows)} {self.model.__name__} rows: {err}, writing them one by one")
+            return self.write_each(rows)
+        except Exception as err:
+            logging.error(f"Error flushing {len(rows)} {self.model.__name__} rows: {err}")
+            self.requeue(rows)
+            return 0
+
+        return len(rows)
+
+    def write_each(self, rows):
+        """
+        Persist rows one by one, dropping the rows the database rejects.
+        """
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                self.model.objects.bulk_create([row], ignore_conflicts=self.ignore_conflicts)
+            except (DataError, IntegrityError) as err:
+                logging.error(f"Dropped a {self.model.__name__} row rejected by the database: {err}")
+                continue
+            except Exception as err:
+                logging.error(f"Error writing {self.model.__name__} rows: {err}")
+                self.requeue(rows[index:])
+                break
+            written += 1
+
+        return written
+
+    def requeue(self, rows):
+        connection.close()
+        with self.lock:
+            self.buffer = (rows + self.buffer)[-self.max_buffer:]
+
+    def ensure_started(self):
+        # The flusher thread does not survive a fork, so prefork children start their own.
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self.closed.clear()
+        self.thread = threading.Thread(target=self.run, name=f"{self.model.__name__}BulkWriter", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.closed.is_set():
+            self.wakeup.wait(timeout=self.max_delay)
+            self.wakeup.clear()
+            self.flush()
+
+        connection.close()
+
+    def close(self, timeout=None):
+        """
+        Stop the flusher thread and write what is left in the buffer.
+        """
+        self.closed.set()
+        self.wakeup.set()
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            self.thread.join(timeout=timeout)
+        self.flush()
+
+    def __len__(self):
+        return len(self.buffer)
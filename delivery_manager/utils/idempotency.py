@@ -0,0 +1,108 @@
+import time
+import logging
+from utils.sqlite_store import SQLiteStore
+
+
+class IdempotencyStore(SQLiteStore):
+    """
+    Bounded, TTL-evicting index of keys persisted in a local SQLite file.
+
+    The file is shared by all processes of the host and survives restarts. `claim` is atomic, so
+    exactly one caller wins a key until it expires after `ttl` seconds. The index is trimmed to
+    `max_entries` keys, oldest first, every `evict_every` claims.
+
+    Attributes:
+        - path (str): The SQLite file backing the store.
+        - ttl (float): The number of seconds a key is remembered.
+        - max_entries (int): The maximum number of keys kept.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS idempotency (key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idempotency_expires_at ON idempotency (expires_at)",
+    ]
+
+    def __init__(self, path, ttl=3600, max_entries=100000, evict_every=1000):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.claims = 0
+
+    def claim(self, key, value=None):
+        """
+        Record a key unless it is already known.
+
+        :return: True if the key was recorded, False if it is a duplicate
+        """
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM idempotency WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO idempotency (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + self.ttl),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.claims += 1
+        if self.claims % self.evict_every == 0:
+            self.evict()
+
+        return cursor.rowcount == 1
+
+    def get(self, key):
+        """
+        Return the value recorded with a key, or None if the key is unknown or expired.
+        """
+        row = self.connection().execute(
+            "SELECT value FROM idempotency WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def seen(self, key):
+        row = self.connection().execute(
+            "SELECT 1 FROM idempotency WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def once(self, key, func):
+        """
+        Wrap `func` so that it is skipped once a call under `key` completed, i.e. returned something else than None.
+
+        When the store cannot be used, `func` is called anyway: repeating a side effect is better than losing it.
+        """
+        def call(*args, **kwargs):
+            try:
+                if self.seen(key):
+                    return None
+            except Exception as err:
+                logging.error(f"Error reading idempotency key {key}: {err}")
+
+            result = func(*args, **kwargs)
+            if result is not None:
+                try:
+                    self.claim(key)
+                except Exception as err:
+                    logging.error(f"Error recording idempotency key {key}: {err}")
+            return result
+
+        return call
+
+    def release(self, key):
+        """
+        Forget a key, e.g. when the work it guarded could not be done and may be retried.
+        """
+        self.connection().execute("DELETE FROM idempotency WHERE key = ?", (key,))
+
+    def evict(self):
+        conn = self.connection()
+        conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM idempotency WHERE key IN ("
+            "SELECT key FROM idempotency ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
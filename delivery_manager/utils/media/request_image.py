@@ -1,27 +1,30 @@
-
 import logging
 import requests
+from utils.api.breaker import BreakerOpen, call_through
+
+# Upper bound of a request when the caller does not give one, so a hanging MediaManager never blocks a worker.
+DEFAULT_TIMEOUT = 10
+
+def send_request(url:str, params:dict, session=None, timeout=DEFAULT_TIMEOUT, breaker=None):
+    """
+    Ask MediaManager for a snapshot of a gate, through the circuit breaker of its endpoint.
 
-def send_request(url:str, params:dict):
-    try:    
-        headers = {
-            'accept': 'application/json'
-        }
-        
-        response = requests.post(url, headers=headers, params=params, data={})
+    Breaker, connection and HTTP errors are logged and answered with None; any other error is raised.
+    """
+    headers = {
+        'accept': 'application/json'
+    }
+    
+    try:
+        response = call_through(
+            breaker,
+            lambda: (session or requests).post(url, headers=headers, params=params, data={}, timeout=timeout or DEFAULT_TIMEOUT),
+        )
         return response.json()
     
-    except requests.exceptions.HTTPError as err:
-        logging.error(f"HTTP Error start video generation: {err}")
-    except requests.exceptions.ConnectionError as conn_err:
-        logging.error(f"Connection error occurred: {conn_err}")
-        return None
-    except requests.exceptions.Timeout as timeout_err:
-        logging.error(f"Timeout error occurred: {timeout_err}")
+    except BreakerOpen as err:
+        logging.error(f"{err}: image request skipped")
         return None
-    except requests.exceptions.RequestException as req_err:
-        logging.error(f"An error occurred: {req_err}")
+    except requests.exceptions.RequestException as err:
+        logging.error(f"Error requesting image: {err}")
         return None
-    except Exception as err:
-        logging.error(f"Error start video generation: {err}")
-        return None
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.sqlite_store import SQLiteStore
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `capacity` tokens.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        self.refill()
+        return self.tokens >= 1
+
+    def take(self):
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class SnapshotSlots(SQLiteStore):
+    """
+    Host-wide cap on the snapshot requests in flight toward MediaManager.
+
+    Each request in flight leases a slot, a row of a local SQLite file shared by all worker processes,
+    so the cap holds across the workers of every partition. A slot never released, e.g. by a process
+    that died during its request, expires after `lease` seconds.
+
+    Attributes:
+        - max_concurrency (int): The maximum number of snapshot requests in flight from all processes.
+        - lease (float): The number of seconds after which an unreleased slot is freed.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS snapshot_slot (holder TEXT PRIMARY KEY, acquired_at REAL NOT NULL)",
+    ]
+
+    def __init__(self, path, max_concurrency=2, lease=60):
+        super().__init__(path)
+        self.max_concurrency = max_concurrency
+        self.lease = lease
+
+    def acquire(self):
+        """
+        Lease a slot if one is free.
+
+        :return: The holder of the slot, to release it with, or None if all slots are taken
+        """
+        now = time.time()
+        holder = uuid.uuid4().hex
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM snapshot_slot WHERE acquired_at < ?", (now - self.lease,))
+            taken, = conn.execute("SELECT COUNT(*) FROM snapshot_slot").fetchone()
+            if taken < self.max_concurrency:
+                conn.execute("INSERT INTO snapshot_slot (holder, acquired_at) VALUES (?, ?)", (holder, now))
+            else:
+                holder = None
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return holder
+
+    def release(self, holder):
+        self.connection().execute("DELETE FROM snapshot_slot WHERE holder = ?", (holder,))
+
+
+class SnapshotScheduler:
+    """
+    Takes snapshots of every on-going delivery at a fixed rate, independently of event arrival.
+
+    Each gate with an on-going delivery has its own token bucket refilled every `interval` seconds,
+    so busy gates never reset each other's timers. A background thread checks the buckets every `tick`
+    seconds and hands due snapshots to `capture`, with at most `max_concurrency` captures in flight
+    across all gates of the process, and a slot of the host-wide `slots` for each of them; gates waiting
+    the longest are served first, and a gate whose capture cannot start keeps its token for the next tick.
+    When the slots cannot be read, the captures only wait for the cap of the process.
+
+    Attributes:
+        - capture: A callable taking the location and the params of the delivery, issuing the snapshot request.
+        - interval (float): The number of seconds between two snapshots of a gate.
+        - max_concurrency (int): The maximum number of snapshot requests in flight toward MediaManager from this process.
+        - slots (SnapshotSlots): The cap on the snapshot requests in flight from all processes, None for no host-wide cap.
+    """
+    def __init__(self, capture, interval=10, max_concurrency=2, tick=1.0, slots=None):
+        self.capture = capture
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.tick = tick
+        self.global_slots = slots
+        self.deliveries = {}
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.executor = None
+        self.thread = None
+        self.pid = None
+
+    def ensure_started(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='snapshot')
+        self.thread = threading.Thread(target=self.run, name="SnapshotScheduler", daemon=True)
+        self.thread.start()
+
+    def start_delivery(self, location, params):
+        """
+        Start taking snapshots of a gate; the params of a gate already scheduled are updated, its timer is kept.
+        """
+        with self.lock:
+            if location in self.deliveries:
+                self.deliveries[location]['params'] = params
+            else:
+                bucket = TokenBucket(rate=1 / self.interval)
+                bucket.tokens = 0
+                self.deliveries[location] = {'params': params, 'bucket': bucket, 'captured_at': 0.0}
+        self.ensure_started()
+
+    def stop_delivery(self, location):
+        with self.lock:
+            self.deliveries.pop(location, None)
+
+    def is_scheduled(self, location):
+        return location in self.deliveries
+
+    def run(self):
+        while True:
+            time.sleep(self.tick)
+            with self.lock:
+                due = sorted(
+                    (
+                        (location, delivery)
+                        for location, delivery in self.deliveries.items()
+                        if delivery['bucket'].available()
+                    ),
+                    key=lambda item: item[1]['captured_at'],
+                )
+
+            for location, delivery in due:
+                if not self.slots.acquire(blocking=False):
+                    break
+                holder = self.acquire_global_slot()
+                if holder is None:
+                    self.slots.release()
+                    break
+                delivery['bucket'].take()
+                delivery['captured_at'] = time.monotonic()
+                self.executor.submit(self.run_capture, location, dict(delivery['params']), holder)
+
+    def acquire_global_slot(self):
+        """
+        :return: The holder of a host-wide slot, True when there is no host-wide cap to wait for, or None if all slots are taken
+        """
+        if self.global_slots is None:
+            return True
+        try:
+            return self.global_slots.acquire()
+        except Exception as err:
+            logging.error(f"Error reading the snapshot slots: {err}")
+            return True
+
+    def release_global_slot(self, holder):
+        if holder is True:
+            return
+        try:
+            self.global_slots.release(holder)
+        except Exception as err:
+            logging.error(f"Error releasing snapshot slot {holder}: {err}")
+
+    def run_capture(self, location, params, holder=True):
+        try:
+            self.capture(location, params)
+        except Exception as err:
+            logging.error(f"Error taking snapshot of {location}: {err}")
+        finally:
+            self.release_global_slot(holder)
+            self.slots.release()
+
+    def __len__(self):
+        return len(self.deliveries)
@@ -0,0 +1,87 @@
+import heapq
+import time
+import itertools
+import threading
+
+
+class ReorderBuffer:
+    """
+    Per-key buffer that releases items in timestamp order instead of arrival order.
+
+    Every item is held for `lateness` seconds after its arrival, so that items of the same key arriving
+    up to `lateness` seconds late are still released before the items they precede. The timestamp of
+    the last applied item of a key is its watermark: items older than the watermark arrive too late to
+    be ordered and are refused by `push`.
+
+    Attributes:
+        - lateness (float): The number of seconds an item is held before it can be released.
+    """
+    def __init__(self, lateness=0.0):
+        self.lateness = lateness
+        self.heaps = {}
+        self.watermarks = {}
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def push(self, key, timestamp, item, force=False):
+        """
+        Buffer an item.
+
+        :param force: Accept the item even if it is older than the last applied item of its key, e.g. when it is re-driven
+        :return: False if the item is older than the last applied item of its key and was refused
+        """
+        with self.lock:
+            watermark = self.watermarks.get(key)
+            if not force and watermark is not None and timestamp < watermark:
+                return False
+
+            heapq.heappush(self.heaps.setdefault(key, []), (timestamp, next(self.sequence), time.monotonic(), item))
+            return True
+
+    def pop_ready(self, key, flush=False):
+        """
+        Release the items of a key whose holding time is over, in timestamp order.
+
+        :param flush: Release all items regardless of their holding time, e.g. on shutdown
+        :return: A list of (timestamp, item) tuples
+        """
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            heap = self.heaps.get(key, [])
+            while heap and (flush or heap[0][2] + self.lateness <= now):
+                timestamp, _, _, item = heapq.heappop(heap)
+                ready.append((timestamp, item))
+            if not heap:
+                self.heaps.pop(key, None)
+
+        return ready
+
+    def requeue(self, key, entries, delay=0.0):
+        """
+        Put released (timestamp, item) tuples back, e.g. after they failed to apply.
+
+        :param delay: The number of seconds before they can be released again; 0 releases them with the next `pop_ready`
+        """
+        held_since = time.monotonic() + delay - self.lateness if delay else float('-inf')
+        with self.lock:
+            heap = self.heaps.setdefault(key, [])
+            for timestamp, item in entries:
+                heapq.heappush(heap, (timestamp, next(self.sequence), held_since, item))
+
+    def applied(self, key, timestamp):
+        """
+        Move the watermark of a key to the timestamp of an item that was applied.
+        """
+        with self.lock:
+            watermark = self.watermarks.get(key)
+            if watermark is None or timestamp > watermark:
+                self.watermarks[key] = timestamp
+
+    def keys(self):
+        with self.lock:
+            return list(self.heaps)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(heap) for heap in self.heaps.values())
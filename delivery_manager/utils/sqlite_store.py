@@ -0,0 +1,64 @@
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+
+# Directory of the stores shared by the processes of the host, and the user[:group] owning their files.
+SQLITE_STORE_DIR = os.getenv('SQLITE_STORE_DIR', '/var/tmp/delivery_manager')
+SQLITE_STORE_OWNER = os.getenv('SQLITE_STORE_OWNER')
+
+
+def store_path(name):
+    """
+    Return the default path of a store file, in SQLITE_STORE_DIR.
+    """
+    return os.path.join(SQLITE_STORE_DIR, name)
+
+
+class SQLiteStore:
+    """
+    Base class of the small stores kept in a local SQLite file.
+
+    The file is shared by all processes of the host and survives restarts. Each thread of each
+    process opens its own connection, in autocommit mode with WAL journaling so readers never
+    block the writer. Subclasses list their tables in SCHEMA.
+
+    The processes sharing a store do not all run as the same user: the events API runs as root, the
+    workers as the container user. A root process hands the directory and the files it creates over
+    to SQLITE_STORE_OWNER, so the other processes can write them too.
+    """
+    SCHEMA = []
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+
+        self.prepare()
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    def prepare(self):
+        path = Path(self.path)
+        path.parent.mkdir(mode=0o775, parents=True, exist_ok=True)
+        if not SQLITE_STORE_OWNER or os.geteuid() != 0:
+            return
+
+        # The database file is created and handed over before SQLite opens it: SQLite gives the WAL
+        # and shared-memory files of a root process the owner of the database file.
+        path.touch(mode=0o664, exist_ok=True)
+        user, _, group = SQLITE_STORE_OWNER.partition(':')
+        for item in (path.parent, path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+            if item.exists():
+                shutil.chown(item, user=user, group=group or None)
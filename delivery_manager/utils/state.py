@@ -1,4 +1,3 @@
-import os
 import time
 from pydantic import BaseModel
 
@@ -70,19 +69,12 @@ class Truck(State):
         return 'Truck'
     
 class StateMachine:
-    def __init__(self):
-        self.state = NoTruck()
-        self.lock_file = 'delivery_status.lock'
-        if os.path.exists(self.lock_file):
-            os.remove(self.lock_file)
+    def __init__(self, name=None, state=None):
+        self.name = name
+        self.state = state if state is not None else NoTruck()
 
     def on_event(self, event=None, timeout=None):
-        if not self.acquire_lock(self.lock_file):
-            return self
-        
         self.state = self.state.on_event(event, timeout)
-        self.release_lock(self.lock_file)
-
         return self
 
     def __repr__(self):
@@ -91,22 +83,66 @@ class StateMachine:
     def __str__(self):
         return str(self.state)
 
-    def acquire_lock(self, lock_file):
-        if os.path.exists(lock_file):
-            print('Lock file, another process is running')
-            return False
-
-        else:
-            with open(lock_file, "w") as f:
-                f.write('Locked.')
-            
-            print('Lock acquired')
-            return True
-    
-    def release_lock(self, lock_file):
-        """Release the lock by deleting the lock file."""
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
-            print("Lock released.")
-        else:
-            print("Lock file does not exist.")
+
+class StateMachineRegistry:
+    """
+    Keeps one StateMachine per gate (PlantEntity.entity_uid), so that gates never share
+    a Truck/NoTruck state.
+
+    The durable source of truth is the DeliveryState table: a gate with an on-going
+    delivery is in the Truck state, any other gate is in the NoTruck state. Machines are
+    rehydrated from it at worker start (see `rehydrate`) or lazily the first time a gate
+    is seen, so a worker restart does not reset the gates.
+    """
+    def __init__(self):
+        self.machines = {}
+
+    def get(self, key, delivery_status=None):
+        """
+        Return the state machine of a gate, creating it from the last known delivery status if needed.
+
+        :param key: The entity_uid of the gate
+        :param delivery_status: The status of the last delivery of the gate, used to seed a new machine
+        :return: The StateMachine of the gate
+        """
+        if key not in self.machines:
+            self.machines[key] = StateMachine(name=key, state=self.state_from_delivery_status(delivery_status))
+        return self.machines[key]
+
+    def sync(self, key, delivery_status=None):
+        """
+        Reset the state machine of a gate to the last delivery status read from the database.
+
+        Workers on other processes or hosts may have moved the gate since this machine last saw it,
+        so the transition must start from the state read under the gate lock.
+
+        :param key: The entity_uid of the gate
+        :param delivery_status: The status of the last delivery of the gate
+        :return: The StateMachine of the gate
+        """
+        machine = self.get(key, delivery_status=delivery_status)
+        machine.state = self.state_from_delivery_status(delivery_status)
+        return machine
+
+    def rehydrate(self, delivery_statuses):
+        """
+        Rebuild the machines of all gates from their last delivery status.
+
+        :param delivery_statuses: A mapping of entity_uid to the status of its last delivery
+        """
+        self.machines = {
+            key: StateMachine(name=key, state=self.state_from_delivery_status(delivery_status))
+            for key, delivery_status in delivery_statuses.items()
+        }
+
+    @staticmethod
+    def state_from_delivery_status(delivery_status):
+        if delivery_status == 'on-going':
+            return Truck()
+        return NoTruck()
+
+    def __len__(self):
+        return len(self.machines)
+
+    def __contains__(self, key):
+        return key in self.machines
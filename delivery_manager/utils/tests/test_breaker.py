@@ -0,0 +1,112 @@
+import tempfile
+from unittest import mock
+from types import SimpleNamespace
+import requests
+from django.test import SimpleTestCase
+from utils.api import breaker as breaker_module
+from utils.api.breaker import CircuitBreakers, BreakerOpen, call_through, CLOSED, OPEN, HALF_OPEN
+from utils.media import request_image
+
+RESET_TIMEOUT = 30
+
+
+class Clock:
+    """
+    Stands in for time.time in the breaker module, moved forward by the tests.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    """
+    The transitions of a breaker: open after consecutive failures, half-open after the reset timeout,
+    then closed by a successful probe or opened again by a failed one.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.clock = Clock()
+        patcher = mock.patch.object(breaker_module.time, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breakers = CircuitBreakers(
+            f"{directory.name}/circuit_breakers.sqlite3", failure_threshold=2, reset_timeout=RESET_TIMEOUT,
+        )
+        self.breaker = self.breakers.breaker('media-manager')
+
+    def state(self):
+        states = {breaker['name']: breaker['state'] for breaker in self.breakers.states()}
+        return states.get(self.breaker.name, CLOSED)
+
+    def open_breaker(self):
+        for _ in range(2):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+        self.assertEqual(self.state(), OPEN)
+
+    def test_consecutive_failures_open_the_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.state(), CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.state(), OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_a_successful_probe_closes_the_breaker(self):
+        self.open_breaker()
+        self.clock.now += RESET_TIMEOUT
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.state(), HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.state(), CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_a_failed_probe_opens_the_breaker_again(self):
+        self.open_breaker()
+        self.clock.now += RESET_TIMEOUT
+
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.state(), OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        self.clock.now += RESET_TIMEOUT
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.state(), HALF_OPEN)
+
+    def test_calls_record_errors_and_server_errors_as_failures(self):
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            call_through(self.breaker, mock.Mock(side_effect=requests.exceptions.ConnectionError("refused")))
+        call_through(self.breaker, lambda: SimpleNamespace(status_code=503))
+        self.assertEqual(self.state(), OPEN)
+
+        send = mock.Mock()
+        with self.assertRaises(BreakerOpen):
+            call_through(self.breaker, send)
+        send.assert_not_called()
+
+    def test_requests_log_request_errors_and_raise_unexpected_ones(self):
+        session = mock.Mock()
+        session.post.side_effect = requests.exceptions.Timeout("timed out")
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(request_image.send_request('http://media', {}, session=session, breaker=self.breaker))
+
+        session.post.side_effect = TypeError("unexpected")
+        with self.assertRaises(TypeError):
+            request_image.send_request('http://media', {}, session=session, breaker=self.breaker)
+        self.assertEqual(self.state(), OPEN)
+
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(request_image.send_request('http://media', {}, session=session, breaker=self.breaker))
+        self.assertEqual(session.post.call_count, 2)
@@ -0,0 +1,46 @@
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase
+from utils import coalesce
+from utils.coalesce import EventCoalescer, TRANSITION, HEARTBEAT, COALESCED
+
+
+class EventCoalescerTest(SimpleTestCase):
+    """
+    Repeated statuses of a gate are dropped between heartbeats, and counted for the next forwarded event.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.coalescer = EventCoalescer(f"{directory.name}/gate_status.sqlite3", window=30)
+
+    def test_coalesced_events_are_summarised_on_the_next_forwarded_event(self):
+        admit = self.coalescer.admit
+        self.assertEqual(admit('gate01', 'Truck', '2026-01-01T00:00:00'), (TRANSITION, None))
+        self.assertEqual(admit('gate01', 'Truck', '2026-01-01T00:00:01'), (COALESCED, None))
+        self.assertEqual(admit('gate01', 'Truck', '2026-01-01T00:00:02'), (COALESCED, None))
+        self.assertEqual(admit('gate02', 'Truck', '2026-01-01T00:00:02'), (TRANSITION, None))
+
+        decision, coalesced = admit('gate01', 'NoTruck', '2026-01-01T00:00:03')
+        self.assertEqual(decision, TRANSITION)
+        self.assertEqual(coalesced, {
+            'status': 'Truck', 'count': 2, 'first_timestamp': '2026-01-01T00:00:01', 'last_timestamp': '2026-01-01T00:00:02',
+        })
+        self.assertEqual(admit('gate01', 'NoTruck', '2026-01-01T00:00:04'), (COALESCED, None))
+
+        with mock.patch.object(coalesce.time, 'time', return_value=coalesce.time.time() + 31):
+            decision, coalesced = admit('gate01', 'NoTruck', '2026-01-01T00:00:40')
+        self.assertEqual(decision, HEARTBEAT)
+        self.assertEqual(coalesced['count'], 1)
+
+    def test_summary_of_an_event_that_failed_to_forward_is_counted_again(self):
+        self.coalescer.admit('gate01', 'Truck', '2026-01-01T00:00:00')
+        self.coalescer.admit('gate01', 'Truck', '2026-01-01T00:00:01')
+        _, coalesced = self.coalescer.admit('gate01', 'NoTruck', '2026-01-01T00:00:02')
+
+        self.coalescer.forget('gate01', coalesced)
+
+        decision, coalesced = self.coalescer.admit('gate01', 'NoTruck', '2026-01-01T00:00:02')
+        self.assertEqual(decision, TRANSITION)
+        self.assertEqual(coalesced['count'], 1)
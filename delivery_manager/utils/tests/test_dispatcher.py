@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+import requests
+from unittest import skipUnless
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.test import SimpleTestCase, tag
+from utils.api.dispatcher import Dispatcher
+from utils.media import request_video
+
+# Latencies of the stub MediaManager, external MediaManager and edge-cloud-sync services, in seconds.
+LATENCIES = (0.05, 0.1, 0.15)
+ROUNDS = 10
+
+
+def stub_server(latency):
+    """
+    Start a keep-alive HTTP server answering every POST with a JSON body after `latency` seconds.
+
+    :return: The server, with the client ports of the connections it accepted in `connections`
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.server.connections.add(self.client_address[1])
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            time.sleep(latency)
+            body = json.dumps({"status": "ok"}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@tag('benchmark')
+@skipUnless(os.getenv('RUN_BENCHMARKS'), "benchmarks only run with RUN_BENCHMARKS=1")
+class DispatcherBenchmarkTest(SimpleTestCase):
+    """
+    Benchmark of the side effects of a transition against local stub services with injected latency:
+    the calls one after another over bare requests, as create_delivery made them, against the
+    dispatcher running them concurrently over pooled sessions.
+    """
+
+    def setUp(self):
+        self.servers = [stub_server(latency) for latency in LATENCIES]
+        self.urls = [f"http://127.0.0.1:{server.server_address[1]}/api/v1/event/rt_video/start" for server in self.servers]
+        for server in self.servers:
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+
+    def test_a_transition_costs_its_slowest_call_instead_of_the_sum_of_its_calls(self):
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            for url in self.urls:
+                requests.post(url, params={'gate_id': 'gate01'}, data={}, timeout=5).json()
+        sequential = (time.perf_counter() - started) / ROUNDS
+
+        for server in self.servers:
+            server.connections.clear()
+        dispatcher = Dispatcher(max_workers=len(self.urls))
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            results = dispatcher.dispatch([
+                (request_video.send_request, {"url": url, "params": {'gate_id': 'gate01'}, "session": dispatcher.session(url), "timeout": 5})
+                for url in self.urls
+            ])
+        dispatched = (time.perf_counter() - started) / ROUNDS
+
+        print(
+            f"\nlatencies {', '.join(f'{latency * 1000:.0f}' for latency in LATENCIES)} ms: "
+            f"sequential {sequential * 1000:.0f} ms, dispatched {dispatched * 1000:.0f} ms per transition"
+        )
+        self.assertEqual(results, [{"status": "ok"}] * len(self.urls))
+        self.assertGreaterEqual(sequential, sum(LATENCIES))
+        self.assertLess(dispatched, (max(LATENCIES) + sum(LATENCIES)) / 2)
+        for server in self.servers:
+            self.assertEqual(len(server.connections), 1)
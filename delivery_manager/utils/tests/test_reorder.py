@@ -0,0 +1,74 @@
+import random
+from unittest import mock
+from django.test import SimpleTestCase
+from utils.reorder import ReorderBuffer
+
+
+class Clock:
+    """
+    Stands in for the time module of utils.reorder, so the holding times are driven by the test.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def shuffled_events(gates, events_per_gate, max_delay, seed):
+    """
+    Events of several gates, one per second per gate, each arriving up to `max_delay` seconds late.
+
+    :return: A list of (arrival, gate, timestamp) tuples in arrival order
+    """
+    rng = random.Random(seed)
+    arrivals = [
+        (timestamp + rng.uniform(0, max_delay), gate, timestamp)
+        for gate in range(gates)
+        for timestamp in range(events_per_gate)
+    ]
+    return sorted(arrivals)
+
+
+class ReorderBufferTest(SimpleTestCase):
+
+    def test_shuffled_events_are_released_in_timestamp_order(self):
+        clock = Clock()
+        with mock.patch('utils.reorder.time', clock):
+            for seed in range(20):
+                buffer = ReorderBuffer(lateness=5)
+                released = {}
+                for arrival, gate, timestamp in shuffled_events(gates=8, events_per_gate=200, max_delay=5, seed=seed):
+                    clock.now = arrival
+                    self.assertTrue(buffer.push(gate, timestamp, timestamp))
+                    for gate_ready in buffer.keys():
+                        for ready_timestamp, _ in buffer.pop_ready(gate_ready):
+                            released.setdefault(gate_ready, []).append(ready_timestamp)
+                            buffer.applied(gate_ready, ready_timestamp)
+
+                for gate in buffer.keys():
+                    released.setdefault(gate, []).extend(timestamp for timestamp, _ in buffer.pop_ready(gate, flush=True))
+
+                self.assertEqual(len(buffer), 0)
+                for gate, timestamps in released.items():
+                    self.assertEqual(timestamps, list(range(200)), f"gate {gate}, seed {seed}")
+
+    def test_events_later_than_the_lateness_window_are_refused_unless_forced(self):
+        buffer = ReorderBuffer()
+        buffer.push('gate01', 1, 'A')
+        buffer.pop_ready('gate01')
+        buffer.push('gate01', 2, 'B')
+        buffer.pop_ready('gate01')
+        buffer.applied('gate01', 2)
+
+        self.assertFalse(buffer.push('gate01', 1, 'A'))
+        self.assertTrue(buffer.push('gate01', 1, 'A', force=True))
+
+    def test_requeued_events_are_held_for_their_delay(self):
+        clock = Clock()
+        with mock.patch('utils.reorder.time', clock):
+            buffer = ReorderBuffer()
+            buffer.requeue('gate01', [(1, 'A'), (2, 'B')], delay=4)
+            self.assertEqual(buffer.pop_ready('gate01'), [])
+            clock.now = 4
+            self.assertEqual(buffer.pop_ready('gate01'), [(1, 'A'), (2, 'B')])
@@ -0,0 +1,61 @@
+import time
+import tempfile
+import threading
+from unittest import mock
+from django.test import SimpleTestCase
+from utils.media import snapshot_scheduler
+from utils.media.snapshot_scheduler import SnapshotScheduler, SnapshotSlots
+
+
+class SnapshotSlotsTest(SimpleTestCase):
+    """
+    The snapshot cap holds across the schedulers of several worker processes sharing the slots.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/snapshot_slots.sqlite3"
+
+    def test_slots_are_leased_up_to_the_cap_and_expire(self):
+        slots = SnapshotSlots(self.path, max_concurrency=2, lease=60)
+        first, second = slots.acquire(), slots.acquire()
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(slots.acquire())
+
+        slots.release(first)
+        self.assertIsNotNone(slots.acquire())
+
+        with mock.patch.object(snapshot_scheduler.time, 'time', return_value=time.time() + 61):
+            self.assertIsNotNone(slots.acquire())
+
+    def test_captures_of_all_schedulers_stay_under_the_cap(self):
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+
+        def capture(location, params):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+
+        # Two worker processes, each allowed 2 captures in flight, sharing a host-wide cap of 2.
+        schedulers = [
+            SnapshotScheduler(capture, interval=0.01, max_concurrency=2, tick=0.01, slots=SnapshotSlots(self.path, max_concurrency=2))
+            for _ in range(2)
+        ]
+        gates = [f"gate{gate}" for gate in range(4)]
+        for scheduler in schedulers:
+            for gate in gates:
+                scheduler.start_delivery(gate, {})
+
+        time.sleep(0.5)
+        for scheduler in schedulers:
+            for gate in gates:
+                scheduler.stop_delivery(gate)
+        time.sleep(0.1)
+
+        self.assertEqual(peak[0], 2)
@@ -5,5 +5,8 @@ set -e
 /bin/bash -c "python3 /home/$user/src/delivery_manager/manage.py migrate"
 /bin/bash -c "python3 /home/$user/src/delivery_manager/manage.py create_superuser"
 
+# Directory of the SQLite stores shared by the events API and the workers, owned by $user
+mkdir -p -m 775 /var/tmp/delivery_manager
+
 # Start Supervisor
 sudo -E supervisord -n -c /etc/supervisord.conf